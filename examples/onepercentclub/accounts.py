@@ -188,6 +188,8 @@ class MigrateMemberAuth(MigrateModel):
     from_model = Member
     to_model = User
 
+    depends_on = []
+
     field_mapping = {
         'id': True, # True means just copy the field
         'email': CropMapping(75),
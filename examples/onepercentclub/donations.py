@@ -58,6 +58,8 @@ class DonationMapping(Mapping):
 class MigrateDonation(MigrateModel):
     from_model = LegacyDonationLine
     to_model = Donation
+
+    depends_on = ['MigrateMemberAuth', 'MigrateProject']
     
     def list_from(self):
         qs = super(MigrateDonation, self).list_from()
@@ -41,6 +41,8 @@ class OrgTolerantSlugifyCroppingMapping(TolerantSlugifyCroppingMapping):
 
 
 class MigrateOrganization(UniqueSlugMixin, MigrateOrganizationBase):
+    depends_on = []
+
     to_model = Organization
 
     field_mapping = {
@@ -94,6 +96,10 @@ class MigrateOrganizationMember(MigrateModel):
     from_model = LegacyOrganizationMember
     to_model = OrganizationMember
 
+    depends_on = ['MigrateMemberAuth', 'MigrateOrganization']
+
+    correspondence_fields = (('mem__pk', 'user__pk'), ('org__pk', 'organization__pk'))
+
     def list_from(self):
         """ Only migrate members for migrated organizations. """
         qs = super(MigrateOrganizationMember, self).list_from()
@@ -140,6 +146,8 @@ class MigrateOrganizationMember(MigrateModel):
 class MigrateOrganizationAddress(MigrateOrganizationBase):
     to_model = OrganizationAddress
 
+    depends_on = ['MigrateOrganization']
+
     def list_from_exclusions(self, qs):
         """ Perform explicit exclusions on the queryset for dirty data. """
         qs = super(MigrateOrganizationAddress, self).list_from_exclusions(qs)
@@ -50,6 +50,10 @@ class MigrateProfile(MigrateModel):
     from_model = Profile
     to_model = UserProfile
 
+    depends_on = ['MigrateMemberAuth']
+
+    correspondence_fields = (('member__pk', 'user__pk'), )
+
     def get_to_correspondence(self, other_object):
         return {'user__pk': other_object.member.pk}
 
@@ -193,6 +197,10 @@ class MigrateUserAddress(MigrateProfile):
     from_model = Profile
     to_model = UserAddress
 
+    depends_on = ['MigrateProfile']
+
+    correspondence_fields = (('member__pk', 'user_profile__user__pk'), )
+
     def get_to_correspondence(self, other_object):
         return {'user_profile__user__pk': other_object.member.pk}
 
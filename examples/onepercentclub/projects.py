@@ -59,15 +59,20 @@ class PhaseMapping(IdentityMapping):
 
         return phase
 
+    def reset(self):
+        self.cached_project_tags = {}
+
     # Caches the project tags so they can be used in both the map() and check() methods.
     def get_project_tags(self, from_instance):
-        if self.cached_project_tags.has_key(from_instance.pk):
-            return self.cached_project_tags[from_instance.pk]
+        # Referenced once, as reset() may replace the cache meanwhile.
+        cached_project_tags = self.cached_project_tags
+        if cached_project_tags.has_key(from_instance.pk):
+            return cached_project_tags[from_instance.pk]
         else:
             project_tags = []
             for tag_object in from_instance.projecttag_set.all():
                 project_tags.append(tag_object.tag.name)
-            self.cached_project_tags[from_instance.pk] = project_tags
+            cached_project_tags[from_instance.pk] = project_tags
             return project_tags
 
     # Override map() to set the act or results phase based on the 'evaluatie' tag.
@@ -152,6 +157,9 @@ class MigrateProjectBase(MigrateModel):
     from_model = LegacyProject
     to_model = Project
 
+    # The phases are migrated onto the migrated projects
+    depends_on = ['MigrateProject']
+
     def list_from_exclusions(self, qs):
         """ Perform explicit exclusions on the queryset for dirty data. """
 
@@ -276,6 +284,8 @@ class ProjectPathToFileMapping(PathToFileMapping):
 class MigrateProject(UniqueSlugMixin, MigrateProjectBase):
     """ Migrations for projects. """
 
+    depends_on = ['MigrateMemberAuth', 'MigrateOrganization']
+
     def migrate_single(self, from_instance, to_instance):
         """
         Override migrate_single so that tags can be copied over using the
@@ -575,6 +585,8 @@ class MigrateLink(MigrateModel):
     from_model = LegacyLink
     to_model = Link
 
+    depends_on = ['MigrateProject']
+
     def list_from(self):
         """ Filter by project status. """
         qs = super(MigrateLink, self).list_from()
@@ -604,6 +616,8 @@ class MigrateTestimonial(MigrateLink):
     from_model = LegacyTestimonial
     to_model = Testimonial
 
+    depends_on = ['MigrateMemberAuth', 'MigrateProject']
+
     def list_from(self):
         """ Only filter addresses for migrated members. """
         qs = super(MigrateTestimonial, self).list_from()
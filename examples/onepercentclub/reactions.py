@@ -1,6 +1,7 @@
 from apps.reactions.models import Reaction
 from django.contrib.contenttypes.models import ContentType
 from legacy.legacyevents.models import Reaction as LegacyReaction
+from .utils import suspended_auto_now
 
 import logging
 logger = logging.getLogger(__name__)
@@ -23,6 +24,19 @@ class ReactionMigrationMixin(object):
             reaction.text = legacy_reaction.text
             reaction.content_type = content_type
             reaction.object_id = to_instance.id
+
+            if self.suspend_auto_now:
+                # Write the datetimes in the INSERT itself.
+                self.set_auto_updated_datetime(legacy_reaction, reaction, 'created', 'created')
+                self.set_auto_updated_datetime(legacy_reaction, reaction, 'created', 'updated')
+                if legacy_reaction.deleted:
+                    self.set_auto_updated_datetime(legacy_reaction, reaction, 'deleted', 'deleted')
+
+                with suspended_auto_now(Reaction, ['created', 'updated', 'deleted']):
+                    reaction.save()
+
+                continue
+
             reaction.save()
 
             self.migrate_auto_updated_datetime(legacy_reaction, reaction, 'created', 'created')
@@ -38,7 +52,7 @@ class ReactionMigrationMixin(object):
             from_reaction_count = LegacyReaction.objects.using(self.from_db).filter(**{event_filter: from_instance}).count()
             from_created = self.make_datetime_timezone_aware(from_instance.created)
 
-            to_instances = self.to_model.objects.filter(created=from_created)
+            to_instances = self.list_to().filter(created=from_created)
             if len(to_instances) != 1:
                 logger.error(u"Can't find from_instance that corresponds to to_instance %s.", from_instance)
                 reaction_success = False
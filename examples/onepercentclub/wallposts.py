@@ -21,6 +21,7 @@ class MigrateVideoWallPosts(ReactionMigrationMixin, MigrateModel):
     from_model = LegacyVideo
     to_model = MediaWallPost
     reaction_to_field = 'prj_project_videos'
+    depends_on = ['MigrateMemberAuth', 'MigrateProject']
 
     def migrate_single(self, from_instance, to_instance):
         super(MigrateVideoWallPosts, self).migrate_single(from_instance, to_instance)
@@ -45,6 +46,10 @@ class MigrateVideoWallPosts(ReactionMigrationMixin, MigrateModel):
         # Return true when everything worked.
         return video_success and reaction_success
 
+    def list_to(self):
+        # Photo wallposts are MediaWallPosts as well, see MigratePhotoWallPosts.
+        return MediaWallPost.objects.using(self.to_db).exclude(video_url='')
+
     def list_from(self):
         qs = super(MigrateVideoWallPosts, self).list_from()
 
@@ -74,6 +79,7 @@ class MigrateTextWallPosts(ReactionMigrationMixin, MigrateModel):
     from_model = LegacyProjectMessage
     to_model = TextWallPost
     reaction_to_field = 'prj_messages'
+    depends_on = ['MigrateMemberAuth', 'MigrateProject']
 
     def migrate_single(self, from_instance, to_instance):
         super(MigrateTextWallPosts, self).migrate_single(from_instance, to_instance)
@@ -140,6 +146,8 @@ class MigratePhotoWallPosts(ReactionMigrationMixin, MigrateModel):
     from_model = LegacyAlbum
     to_model = MediaWallPost
     reaction_to_field = 'alb_albums'
+    # Both write MediaWallPost, so don't run alongside the video migration
+    depends_on = ['MigrateMemberAuth', 'MigrateProject', 'MigrateVideoWallPosts']
 
     photo_mapping = PathToFileMapping(root_path=settings.LEGACY_MEDIA_ROOT + '/assets/files/filemanager',
                                       allow_missing=True, download_prefix='assets/files/filemanager')
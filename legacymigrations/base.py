@@ -1,19 +1,53 @@
+import gc
 import time
+import hashlib
+import operator
+from contextlib import contextmanager
 from datetime import datetime
 from django.utils import timezone
 from django.core.management.color import no_style
 from django.db import connections
 from django.db import transaction
-from django.core.exceptions import ValidationError, NON_FIELD_ERRORS, ObjectDoesNotExist
+from django.db.models import Q, Max
+from django.db.models.query import QuerySet
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS, ObjectDoesNotExist, FieldError
 from pytz.exceptions import AmbiguousTimeError
 from .mappings import IdentityMapping, NullMapping, RelatedObjectMapping, AutoUpdatedDateTimeMapping, OneToManyMapping
-from .settings import ENABLE_EXCLUSIONS
-from .utils import Timer
+from .models import MigrationCheckpoint, RowDigest
+from .settings import (
+    ENABLE_EXCLUSIONS, BATCH_SIZE, CORRESPONDENCE_INDEX_LIMIT, CHUNK_SIZE,
+    SUSPEND_AUTO_NOW, COMMIT_BATCHES, INCREMENTAL, WRITER, LIGHTWEIGHT_ROWS,
+    VALIDATION, VALIDATION_SAMPLE, VERIFY, VERIFY_SEED, VERIFY_BATCHES,
+    MAX_ERRORS, ESTIMATE_COUNTS, PROFILE, PROFILE_JSON, MEMORY_BUDGET,
+    SQL_PUSHDOWN, MEMO_SIZE
+)
+from .utils import (
+    Measurement, iter_chunks, suspended_auto_now, get_row_class, clear_queries,
+    get_rss, LRUCache, get_ordering
+)
+from .parallel import migrate_parallel, verify_parallel
+from .writers import CopyWriter
+from .pushdown import migrate_pushdown
+from .progress import Progress, count_objects
+from .profiling import Profiler
+from .validation import FastValidator
+from .verification import (
+    MergeVerifier, DigestVerifier, SampleVerifier, Sampler, BatchVerifier,
+    OrderMismatch, get_sample_size
+)
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# Marker for correspondence keys matching more than one destination object.
+_AMBIGUOUS = object()
+
+# Marker for correspondence keys of objects written by bulk_create(), which
+# does not tell the pk of the new object.
+_CREATED = object()
+
+
 class MigrateModel(object):
     """
     Generic migration class, from one model class to another.
@@ -24,9 +58,138 @@ class MigrateModel(object):
     from_db = 'legacy'
     to_db = 'default'
 
+    # Names of the migration classes this migration depends on, used to run
+    # independent migrations concurrently. None means depending on all
+    # migrations preceding this one in `LEGACY_MIGRATIONS`.
+    depends_on = None
+
+    # Number of objects to collect before writing them with a single
+    # bulk_create(), None means saving every object individually.
+    batch_size = BATCH_SIZE
+
+    # Number of source objects fetched per query while migrating.
+    chunk_size = CHUNK_SIZE
+
+    # How new objects are written in batched mode: 'bulk' for bulk_create(),
+    # 'copy' for PostgreSQL's COPY or 'auto' to use COPY whenever nothing
+    # has to be done after saving the objects.
+    writer = WRITER
+
+    # Commit every batch along with a checkpoint, rather than committing the
+    # whole migration at once after the integrity tests have passed.
+    commit_batches = COMMIT_BATCHES
+
+    # Only migrate source objects which changed since the last successful
+    # run. Changes are detected using `change_field` when set, or by comparing
+    # digests of the content of source objects otherwise.
+    incremental = INCREMENTAL
+
+    # Source field, like `updated`, which is set whenever an object changes.
+    change_field = None
+
+    # Pairs of source and destination fields, like `('pk', 'pk')`, holding
+    # equal values for corresponding objects. Used to test the migration by
+    # merging both querysets, which migrations with a custom correspondence
+    # have to define for this.
+    correspondence_fields = None
+
+    # How the migration is verified: 'merge' for testing every object,
+    # 'digest' for comparing digests of primary key ranges of source and
+    # destination objects, only testing objects in ranges which differ, or
+    # 'sample:<fraction or count>' for testing a random sample of objects.
+    verify = VERIFY
+
+    # Seed for selecting a reproducible sample of objects to verify.
+    verify_seed = VERIFY_SEED
+
+    # Verify every batch in a background thread right after committing it,
+    # aborting the migration once more than `max_errors` objects failed.
+    verify_batches = VERIFY_BATCHES
+    max_errors = MAX_ERRORS
+
+    # Read source objects as lightweight rows of plain column values rather
+    # than as model instances. Migrations which need related objects or
+    # model methods of source objects should set this to False.
+    lightweight_rows = LIGHTWEIGHT_ROWS
+
+    # How migrated objects are validated: 'full' for full_clean() on every
+    # object, 'fast' for validating objects in batches with a few queries per
+    # batch or None to skip validation. Validation errors are only logged.
+    validation = VALIDATION
+
+    # Validate only one in this number of migrated objects.
+    validation_sample = VALIDATION_SAMPLE
+
+    # Estimate the number of objects for progress reports from the statistics
+    # of the database where possible, rather than counting them.
+    estimate_counts = ESTIMATE_COUNTS
+
+    # Write auto updated datetime fields in the INSERT or UPDATE of the object
+    # itself rather than with a separate UPDATE after saving.
+    suspend_auto_now = SUSPEND_AUTO_NOW
+
+    # Maximum number of destination objects to keep in the in-memory
+    # correspondence index, None disables the index.
+    correspondence_index_limit = CORRESPONDENCE_INDEX_LIMIT
+
+    # Migrate with a single INSERT ... SELECT when the source and destination
+    # share a PostgreSQL database, the destination is empty and all mappings
+    # can be expressed in SQL, see :ref:`sql-pushdown`.
+    sql_pushdown = SQL_PUSHDOWN
+
+    # Methods which, when overridden, require objects to be migrated in
+    # Python.
+    _pushdown_hooks = (
+        'map_fields', 'migrate_single', 'pre_validate', 'pre_save',
+        'post_save', 'pre_save_batch', 'post_save_batch',
+    )
+
+    # Maximum resident memory of the process in megabytes while migrating.
+    # When exceeded after a batch, the batch size is halved for the remaining
+    # batches. None means no limit.
+    memory_budget = MEMORY_BUDGET
+
+    # Report the time spent per phase and per field mapping after migrating,
+    # optionally writing it as JSON to `profile_json`, in which '%s' is
+    # replaced by the name of the migration.
+    profile = PROFILE
+    profile_json = PROFILE_JSON
+
+    # Methods timed as phases when profiling.
+    _profiled_phases = (
+        'get_to', '_prefetch_to', 'migrate_single', 'map_fields_batch',
+        'pre_validate',
+        'validate_batch', 'pre_save', 'pre_save_batch', '_save', '_write_new',
+        '_migrate_auto_updated_datetimes', 'post_save', 'post_save_batch',
+        'test_single', 'test_batch',
+    )
+
+    # The :class:`~profiling.Profiler` while profiling.
+    _profiler = None
+
+    # Number of results cached for every pure mapping while migrating, see
+    # :ref:`memoization`. 0, the default, disables caching.
+    memo_size = MEMO_SIZE
+
+    # `(field, mapping, cache)` for the pure mappings cached while migrating.
+    _memos = ()
+
+    # Objects mapped within the current batch which have not been written yet.
+    _pending_instances = ()
+
+    # Destination objects looked up in advance for the current batch, by
+    # correspondence key.
+    _to_prefetched = {}
+
     def __repr__(self):
         return self.__class__.__name__
 
+    def _overrides(self, name):
+        """ Whether the method `name` is overridden by a subclass. """
+
+        return getattr(self.__class__, name).im_func is not \
+            getattr(MigrateModel, name).im_func
+
     def __init__(self):
         # Used to store auto update datetime fields that need to be migrated.
         self.auto_updated_datetime_fields = []
@@ -50,6 +213,41 @@ class MigrateModel(object):
 
         return self._from_qs
 
+    def _iter_from_batches(self, from_qs, after_pk=None):
+        """
+        Iterate over the objects in `from_qs` in lists of `batch_size` or
+        `chunk_size` objects, so memory use stays flat regardless of the size
+        of the source table. Objects come in primary key order unless `from_qs`
+        is ordered otherwise, see :func:`~utils.iter_chunks`. When `after_pk`
+        is given, only objects with a larger primary key are returned, which
+        requires primary key order.
+
+        With `lightweight_rows`, the objects are rows returned by
+        :func:`~utils.get_row_class` rather than model instances.
+        """
+
+        if after_pk is not None:
+            from_qs = from_qs.filter(pk__gt=after_pk)
+
+        factory = None
+
+        if self.lightweight_rows and isinstance(from_qs, QuerySet):
+            row_class = get_row_class(from_qs.model)
+
+            if row_class:
+                from_qs = from_qs.values_list(
+                    *[field.name for field in from_qs.model._meta.fields]
+                )
+                factory = row_class._make
+
+            else:
+                logger.warning(
+                    u'Fields of %s cannot be read as lightweight rows, using model instances.',
+                    from_qs.model.__name__
+                )
+
+        return iter_chunks(from_qs, self.batch_size or self.chunk_size, factory)
+
     def _list_to(self):
         """ Caching wrapper for list_to() method. """
 
@@ -86,29 +284,97 @@ class MigrateModel(object):
 
         return mapping
 
+    def _get_mappings(self):
+        """
+        Return a list of `(field, mapping)` tuples for all fields in
+        `field_mapping`, resolved once per migration.
+        """
+
+        if not hasattr(self, '_mappings'):
+            self._mappings = [
+                (field, self.get_mapping(field))
+                for field in self.field_mapping.iterkeys()
+            ]
+
+        return self._mappings
+
+    def _get_mapping_plan(self):
+        """
+        Return the flat list of steps performing all field mappings, compiled
+        once per migration from `field_mapping`. See :meth:`Mapping.compile`.
+        """
+
+        if not hasattr(self, '_mapping_plan'):
+            self._mapping_plan = []
+
+            for (field, mapping) in self._get_mappings():
+                steps = mapping.compile(field)
+
+                if self._profiler:
+                    name = u'%s (%s)' % (field, mapping.__class__.__name__)
+
+                    steps = [
+                        self._profiler.wrap('mapping', name, step)
+                        for step in steps
+                    ]
+
+                self._mapping_plan.extend(steps)
+
+        return self._mapping_plan
+
     def map_fields(self, from_instance, to_instance):
         """
         Copy all fields from one object to another.
+
+        Auto-updated fields are ignored as they're dealt with after the model
+        is saved.
         """
 
-        for field in self.field_mapping.iterkeys():
-            # Get the mapping
-            mapping = self.get_mapping(field)
+        for step in self._get_mapping_plan():
+            step(from_instance, to_instance)
 
-            # Ignore auto-updated fields as they're dealt with after the model is saved.
-            if isinstance(mapping, AutoUpdatedDateTimeMapping):
-                continue
+    def _get_batch_plan(self):
+        """
+        Return the list of steps performing all field mappings for batches of
+        objects, compiled once per migration. Steps take lists of source and
+        destination objects. Vectorized mappings map all objects at once,
+        other mappings are performed object by object.
+        """
+
+        if not hasattr(self, '_batch_plan'):
+            self._batch_plan = []
+
+            for (field, mapping) in self._get_mappings():
+                if mapping.vectorized:
+                    def step(from_instances, to_instances, field=field, mapping=mapping):
+                        for (to_field, values) in mapping.map_batch(from_instances, field):
+                            for (to_instance, value) in zip(to_instances, values):
+                                setattr(to_instance, to_field, value)
 
-            value_dict = mapping(from_instance, field)
+                else:
+                    def step(from_instances, to_instances, steps=mapping.compile(field)):
+                        for (from_instance, to_instance) in zip(from_instances, to_instances):
+                            for object_step in steps:
+                                object_step(from_instance, to_instance)
+
+                if self._profiler:
+                    name = u'%s (%s)' % (field, mapping.__class__.__name__)
+
+                    step = self._profiler.wrap('mapping', name, step)
+
+                self._batch_plan.append(step)
 
-            assert isinstance(value_dict, dict), \
-                'Mapping %s returned %s instead of a dict.' % \
-                    (mapping, value_dict)
+        return self._batch_plan
 
-            for (new_field, new_value) in value_dict.iteritems():
-                assert isinstance(new_field, basestring)
+    def map_fields_batch(self, from_instances, to_instances):
+        """
+        Map all fields of a batch of objects, see :meth:`map_fields`. Used
+        instead of :meth:`migrate_single` for batches, unless either of them
+        is overridden.
+        """
 
-                setattr(to_instance, new_field, new_value)
+        for step in self._get_batch_plan():
+            step(from_instances, to_instances)
 
     def list_from(self):
         """
@@ -143,16 +409,300 @@ class MigrateModel(object):
 
         return {'pk': other_object.pk}
 
+    def _get_to_key(self, from_instance):
+        """
+        Return the correspondence fields and the key values identifying the
+        object corresponding to `from_instance`.
+        """
+
+        correspondence_args = self.get_to_correspondence(from_instance)
+
+        fields = tuple(sorted(correspondence_args.iterkeys()))
+        key = tuple(correspondence_args[field] for field in fields)
+
+        return (fields, key)
+
+    def _build_to_index(self, qs, fields):
+        """
+        Return a dictionary mapping correspondence keys for `fields` to the
+        pk of the matching object in `qs`.
+        """
+
+        index = {}
+
+        pk_name = self.to_model._meta.pk.name
+        for row in qs.values_list(pk_name, *fields).iterator():
+            key = row[1:]
+
+            if key in index:
+                # Let get_to() fail the way it always has
+                index[key] = _AMBIGUOUS
+            else:
+                index[key] = row[0]
+
+        return index
+
+    def _get_to_index(self, fields):
+        """
+        Return the in-memory correspondence index for `fields`, built once
+        from :meth:`list_to`. Returns None when the index is disabled or when
+        the destination table is too large to index.
+        """
+
+        if getattr(self, '_to_index_fields', None) != fields:
+            self._to_index_fields = fields
+            self._to_index = None
+
+            limit = self.correspondence_index_limit
+
+            if limit and self._list_to().count() <= limit:
+                try:
+                    self._to_index = self._build_to_index(self._list_to(), fields)
+
+                except FieldError:
+                    logger.warning(
+                        u"Correspondence %s cannot be indexed, falling back to querying.",
+                        fields
+                    )
+
+        return self._to_index
+
+    def _add_to_index(self, from_instance, to_instance):
+        """
+        Register a newly created object with the correspondence index and the
+        prefetched objects. Objects without a pk are looked up by their key
+        when their key is used again.
+        """
+
+        (fields, key) = self._get_to_key(from_instance)
+
+        if getattr(self, '_to_index', None) is not None and \
+                self._to_index_fields == fields:
+            if to_instance.pk is None:
+                self._to_index[key] = _CREATED
+            else:
+                self._to_index[key] = to_instance.pk
+
+        if key in self._to_prefetched:
+            self._to_prefetched[key] = to_instance
+
+    def _reset_to_index(self):
+        """ Drop the correspondence index and prefetched objects. """
+
+        self._to_index_fields = None
+        self._to_index = None
+        self._to_prefetched = {}
+
+    def _reset_mappings(self):
+        """ Drop the state cached by the field mappings. """
+
+        if hasattr(self, '_mappings'):
+            for (field, mapping) in self._mappings:
+                mapping.reset()
+
+    def _clear_caches(self):
+        """
+        Drop the querysets, correspondence index and mapping state cached
+        during the migration, so a finished migration does not hold on to
+        memory while others run in the same process.
+        """
+
+        for name in ('_from_qs', '_to_qs'):
+            if name in self.__dict__:
+                delattr(self, name)
+
+        self._reset_to_index()
+        self._reset_mappings()
+
+        clear_queries()
+
+    def _release_memory(self, resizable=True):
+        """
+        Release the memory held for the batch just migrated and check the
+        memory use against `memory_budget`, halving the batch size when it is
+        exceeded. Returns True when the batch size has been changed, in which
+        case the remaining objects should be read in smaller batches.
+        """
+
+        clear_queries()
+        self._reset_mappings()
+
+        if not self.memory_budget or not resizable:
+            return False
+
+        budget = self.memory_budget * 1048576
+
+        rss = get_rss()
+        if rss is None or rss <= budget:
+            return False
+
+        # Memory held by reference cycles might be all there is to free
+        gc.collect()
+
+        rss = get_rss()
+        if rss <= budget:
+            return False
+
+        size = self.batch_size or self.chunk_size
+
+        if size <= 1:
+            if not getattr(self, '_memory_exceeded', False):
+                logger.warning(
+                    u'Memory use of %.1f MB exceeds the budget of %d MB, batches cannot be made any smaller.',
+                    rss / 1048576.0, self.memory_budget
+                )
+
+                self._memory_exceeded = True
+
+            return False
+
+        size = max(size // 2, 1)
+
+        logger.warning(
+            u'Memory use of %.1f MB exceeds the budget of %d MB, continuing with batches of %d objects.',
+            rss / 1048576.0, self.memory_budget, size
+        )
+
+        if self.batch_size:
+            self.batch_size = size
+        else:
+            self.chunk_size = size
+
+        return True
+
+    def _filter_to_keys(self, fields, keys):
+        """
+        Return the destination objects matching any of the correspondence
+        `keys` for `fields`.
+        """
+
+        if len(fields) == 1:
+            return self._list_to().filter(**{
+                '%s__in' % fields[0]: [key[0] for key in keys]
+            })
+
+        return self._list_to().filter(reduce(operator.or_, [
+            Q(**dict(zip(fields, key))) for key in keys
+        ]))
+
+    def _find_to(self, from_instances):
+        """
+        Return a list with the object corresponding to each object in
+        `from_instances`, or None when there is none. Unlike :meth:`get_to`,
+        this does not use nor update any cached lookups, so it can be used
+        from other threads.
+        """
+
+        if self._overrides('get_to'):
+            return [self.get_to(from_instance) for from_instance in from_instances]
+
+        keys = [self._get_to_key(from_instance) for from_instance in from_instances]
+
+        if not keys:
+            return []
+
+        fields = keys[0][0]
+        keys = [key for (fields, key) in keys]
+
+        qs = self._filter_to_keys(fields, keys)
+        index = self._build_to_index(qs, fields)
+        instances = qs.in_bulk([pk for pk in index.itervalues() if pk is not _AMBIGUOUS])
+
+        to_instances = []
+        for (from_instance, key) in zip(from_instances, keys):
+            pk = index.get(key)
+
+            if pk is _AMBIGUOUS:
+                logger.error(
+                    u"Several objects correspond to '%s'.", unicode(from_instance)
+                )
+
+                pk = None
+
+            to_instances.append(instances.get(pk))
+
+        return to_instances
+
+    def _prefetch_to(self, from_instances):
+        """
+        Look up the objects corresponding to a batch of `from_instances` with
+        a single query, so :meth:`get_to` does not have to query per object.
+        When the destination is too large for the in-memory index, the
+        correspondence keys for just this batch are resolved instead.
+        """
+
+        self._to_prefetched = {}
+
+        # Custom lookups cannot benefit from prefetching
+        if self._overrides('get_to'):
+            return
+
+        keys = []
+        for from_instance in from_instances:
+            (fields, key) = self._get_to_key(from_instance)
+            keys.append(key)
+
+        if not keys:
+            return
+
+        index = self._get_to_index(fields)
+
+        if index is None:
+            try:
+                index = self._build_to_index(self._filter_to_keys(fields, keys), fields)
+            except FieldError:
+                return
+
+        else:
+            # Written by an earlier batch, without learning the pk
+            created = [key for key in keys if index.get(key) is _CREATED]
+
+            if created:
+                index.update(
+                    self._build_to_index(self._filter_to_keys(fields, created), fields)
+                )
+
+        pks = [index[key] for key in keys
+            if index.get(key) not in (None, _AMBIGUOUS, _CREATED)]
+        instances = self._list_to().in_bulk(pks)
+
+        for key in keys:
+            pk = index.get(key)
+
+            if pk is None:
+                self._to_prefetched[key] = None
+
+            elif pk not in (_AMBIGUOUS, _CREATED):
+                self._to_prefetched[key] = instances.get(pk)
+
     def get_to(self, from_instance):
         """
         Given an existing 'old' instance, return the corresponding 'new'
         instance or None if no corresponding object exists.
+
+        Lookups are done against an in-memory correspondence index, so only
+        objects which actually exist are queried for.
         """
 
+        (fields, key) = self._get_to_key(from_instance)
+
+        if key in self._to_prefetched:
+            return self._to_prefetched[key]
+
+        correspondence_args = dict(zip(fields, key))
+
+        index = self._get_to_index(fields)
+        if index is not None:
+            pk = index.get(key)
+
+            if pk is None:
+                return None
+
+            if pk not in (_AMBIGUOUS, _CREATED):
+                correspondence_args = {'pk': pk}
+
         # Default is to look up by id
         try:
-            correspondence_args = self.get_to_correspondence(from_instance)
-
             return self._list_to().get(**correspondence_args)
 
         except self.to_model.DoesNotExist:
@@ -178,10 +728,7 @@ class MigrateModel(object):
 
         success = True
 
-        for from_field in self.field_mapping.iterkeys():
-            # Get the mapping
-            mapping = self.get_mapping(from_field)
-
+        for (from_field, mapping) in self._get_mappings():
             if not mapping.check(from_instance, to_instance, from_field):
                 logger.error(
                     u"Mapping '%s' for field '%s' on '%s' does not correspond",
@@ -210,6 +757,36 @@ class MigrateModel(object):
 
         return self.test_map_fields(from_instance, to_instance)
 
+    def test_batch(self, from_instances, to_instances):
+        """
+        Test the migration of a batch of objects, returning a list with the
+        result of :meth:`test_single` for every pair of objects. Unless
+        :meth:`test_single` or :meth:`test_map_fields` is overridden, every
+        mapping checks all objects at once.
+        """
+
+        if self._overrides('test_single') or self._overrides('test_map_fields'):
+            return [
+                self.test_single(from_instance, to_instance)
+                for (from_instance, to_instance) in zip(from_instances, to_instances)
+            ]
+
+        results = [True] * len(from_instances)
+
+        for (from_field, mapping) in self._get_mappings():
+            checks = mapping.check_batch(from_instances, to_instances, from_field)
+
+            for (position, check_result) in enumerate(checks):
+                if not check_result:
+                    logger.error(
+                        u"Mapping '%s' for field '%s' on '%s' does not correspond",
+                        mapping, from_field, unicode(from_instances[position])
+                    )
+
+                    results[position] = False
+
+        return results
+
     def test_count_querysets(self):
         # Make sure we have the same number of source and destination objects
         success = True
@@ -223,6 +800,61 @@ class MigrateModel(object):
             success = False
         return success
 
+    def _get_correspondence_fields(self):
+        """
+        Return the pairs of source and destination fields holding the
+        correspondence keys, or None when these are not known.
+        """
+
+        if self.correspondence_fields is not None:
+            return self.correspondence_fields
+
+        # Custom correspondence needs explicit correspondence fields
+        if self._overrides('get_to_correspondence') or \
+                self._overrides('get_from_correspondence'):
+            return None
+
+        return (('pk', 'pk'), )
+
+    def _get_verifier(self, from_qs, to_qs=None):
+        """
+        Return a :class:`~verification.MergeVerifier` or, depending on
+        `verify`, a :class:`~verification.DigestVerifier` or
+        :class:`~verification.SampleVerifier` for testing objects, or None
+        when objects have to be tested one by one.
+        """
+
+        correspondence_fields = self._get_correspondence_fields()
+
+        if correspondence_fields is None or \
+                self._overrides('get_to') or self._overrides('get_from'):
+            return None
+
+        if to_qs is None:
+            to_qs = self._list_to()
+
+        for qs in (from_qs, to_qs):
+            if not isinstance(qs, QuerySet) or not qs.query.can_filter():
+                return None
+
+        sample_size = get_sample_size(self.verify)
+
+        if sample_size is not None:
+            return SampleVerifier(
+                self, from_qs, to_qs, correspondence_fields,
+                Sampler(sample_size, self.verify_seed)
+            )
+
+        if self.verify == 'digest':
+            if tuple(correspondence_fields) == (('pk', 'pk'), ):
+                return DigestVerifier(self, from_qs, to_qs)
+
+            logger.warning(
+                u'Digest verification requires correspondence by pk, testing all objects.'
+            )
+
+        return MergeVerifier(self, from_qs, to_qs, correspondence_fields)
+
     def test_multiple(self, from_qs):
         """
         Test the migration for all objects in to_qs.
@@ -234,11 +866,83 @@ class MigrateModel(object):
 
         success = self.test_count_querysets()
 
-        # Do per-object checks
+        verifier = self._get_verifier(from_qs)
+        workers = getattr(self, '_test_workers', None)
+
+        sample_size = get_sample_size(self.verify)
+
+        total = None
+        if sample_size is None:
+            total = count_objects(self._list_to(), self.estimate_counts)
+
+        progress = Progress(u'Testing %s' % self, total)
+
+        if isinstance(verifier, MergeVerifier):
+            verifier.progress = progress
+
+        if verifier:
+            try:
+                # Samples are small enough to test in a single process
+                if workers and workers > 1 and \
+                        not isinstance(verifier, SampleVerifier):
+                    (counter, errors, failures) = verify_parallel(
+                        self, verifier.from_qs, verifier.to_qs,
+                        self._get_correspondence_fields()[0], workers
+                    )
+
+                    if failures:
+                        logger.error(
+                            u'Failed correspondences (source pk, destination pk): %s',
+                            u', '.join(u'(%s, %s)' % failure for failure in failures)
+                        )
+
+                else:
+                    (counter, errors) = verifier.verify()
+
+            except OrderMismatch as e:
+                logger.warning(
+                    u'Correspondence keys cannot be merged, testing objects one by one: %s', e
+                )
+
+                verifier = None
+
+        if not verifier:
+            if sample_size is None:
+                (counter, errors) = self._test_objects(from_qs, progress=progress)
+
+            else:
+                sampler = Sampler(sample_size, self.verify_seed)
+
+                (counter, errors) = self._test_objects(from_qs, sampler, progress)
+
+                sampler.log_estimate(errors, counter)
+
+        if errors:
+            success = False
+
+        logger.info('%d objects tested, %d fails', counter, errors)
+
+        return success
+
+    def _test_objects(self, from_qs, sampler=None, progress=None):
+        """
+        Test objects one by one, looking up the corresponding object of every
+        destination object, or of a sample selected by `sampler`. Returns the
+        number of objects tested along with the number of failures.
+        """
+
         counter = 0
         errors = 0
 
-        for to_instance in self._list_to().all():
+        to_instances = self._list_to().all()
+
+        if sampler:
+            if isinstance(to_instances, QuerySet):
+                to_instances = to_instances.iterator()
+
+            to_instances = sampler.sample(to_instances)
+
+        for to_instance in to_instances:
             check_success = True
 
             from_instance = self.get_from(to_instance)
@@ -282,15 +986,32 @@ class MigrateModel(object):
 
             if not check_success:
                 errors += 1
-                success = False
 
-            # Print a progress message very 50 objects
-            if (counter % 50) == 0:
-                logger.info('%d objects tested', counter)
+            if progress:
+                progress.add(1)
 
-        logger.info('%d objects tested, %d fails', counter, errors)
+        return (counter, errors)
 
-        return success
+    def _log_validation_errors(self, instance, message_dict):
+        """ Report the validation errors of an instance. """
+
+        for (field, errors) in message_dict.iteritems():
+            for error in errors:
+                if field == NON_FIELD_ERRORS:
+                    logger.warning(
+                        u"General validation error for '%s': %s",
+                        instance, error
+                    )
+                else:
+                    try:
+                        value = getattr(instance, field)
+                    except ObjectDoesNotExist:
+                        value = '<Not Found>'
+
+                    logger.warning(
+                        u"Validation error for field '%s' with value '%s' of '%s': %s",
+                        field, value, instance, error
+                    )
 
     def validate_single(self, instance):
         """
@@ -301,27 +1022,47 @@ class MigrateModel(object):
             instance.full_clean()
 
         except ValidationError as e:
-            for (field, errors) in e.message_dict.iteritems():
-                for error in errors:
-                    if field is NON_FIELD_ERRORS:
-                        logger.warning(
-                            u"General validation error for '%s': %s",
-                            instance, error
-                        )
-                    else:
-                        try:
-                            value = getattr(instance, field)
-                        except ObjectDoesNotExist:
-                            value = '<Not Found>'
-
-                        logger.warning(
-                            u"Validation error for field '%s' with value '%s' of '%s': %s",
-                            field, value, instance, error
-                        )
+            self._log_validation_errors(instance, e.message_dict)
 
             # Eventually, we should *not* let these errors pass
             # raise e
 
+    def _get_validator(self):
+        """ Return the :class:`~validation.FastValidator` for `to_model`. """
+
+        if not hasattr(self, '_validator'):
+            self._validator = FastValidator(self.to_model, self.to_db)
+
+        return self._validator
+
+    def validate_batch(self, instances):
+        """
+        Validate a batch of instances according to `validation`, reporting
+        back any errors. Only one in `validation_sample` instances is
+        validated.
+        """
+
+        if not self.validation:
+            return
+
+        if self.validation_sample > 1:
+            offset = getattr(self, '_validation_offset', 0)
+            self._validation_offset = (offset + len(instances)) % self.validation_sample
+
+            instances = instances[
+                (self.validation_sample - offset) % self.validation_sample::
+                self.validation_sample
+            ]
+
+        # Custom validation takes precedence
+        if self.validation == 'fast' and not self._overrides('validate_single'):
+            for (instance, message_dict) in self._get_validator().validate(instances):
+                self._log_validation_errors(instance, message_dict)
+
+        else:
+            for instance in instances:
+                self.validate_single(instance)
+
 
     def migrate_single(self, from_instance, to_instance):
         """ Migrate a single object. """
@@ -332,7 +1073,13 @@ class MigrateModel(object):
 
         self.map_fields(from_instance, to_instance)
 
-    def _migrate_from(self, from_instance):
+    def _prepare_from(self, from_instance, validate=True):
+        """
+        Get or create the object corresponding to `from_instance`, map the
+        fields onto it and validate it, without saving. Batches validate
+        their objects all at once, passing `validate=False`.
+        """
+
         to_instance = self.get_to(from_instance)
 
         # Not existing? Create one!
@@ -341,28 +1088,237 @@ class MigrateModel(object):
 
         self.migrate_single(from_instance, to_instance)
 
+        if self.suspend_auto_now:
+            self._set_auto_updated_datetimes(from_instance, to_instance)
+
         self.pre_validate(from_instance, to_instance)
 
         # Validate the model
         # (before saving, to find any errors in a timely fashion)
-        self.validate_single(to_instance)
+        if validate:
+            self.validate_batch([to_instance])
 
-        self.pre_save(from_instance, to_instance)
+        return to_instance
 
-        # Save to the database
-        to_instance.save(using=self.to_db)
+    def _prepare_batch(self, from_instances):
+        """
+        Prepare the objects corresponding to a batch of `from_instances` like
+        :meth:`_prepare_from`, mapping the fields of all objects at once with
+        :meth:`map_fields_batch` unless :meth:`migrate_single` or
+        :meth:`map_fields` is overridden.
+
+        Every prepared object is added to `_pending_instances` right away, so
+        objects mapped later in the batch can take it into account.
+        """
+
+        if self._overrides('migrate_single') or self._overrides('map_fields'):
+            to_instances = []
+
+            for from_instance in from_instances:
+                to_instance = self._prepare_from(from_instance, validate=False)
+
+                to_instances.append(to_instance)
+                self._pending_instances.append(to_instance)
+
+            return to_instances
+
+        to_instances = []
+        for from_instance in from_instances:
+            to_instance = self.get_to(from_instance)
+
+            # Not existing? Create one!
+            if not to_instance:
+                to_instance = self.to_model()
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(u"Migrating '%s' to '%s'",
+                    unicode(from_instance), unicode(to_instance))
+
+            to_instances.append(to_instance)
+
+        self.map_fields_batch(from_instances, to_instances)
+
+        for (from_instance, to_instance) in zip(from_instances, to_instances):
+            if self.suspend_auto_now:
+                self._set_auto_updated_datetimes(from_instance, to_instance)
+
+            self.pre_validate(from_instance, to_instance)
+
+            self._pending_instances.append(to_instance)
+
+        return to_instances
+
+    def _get_auto_updated_fields(self):
+        """ Return the destination fields of auto updated datetime mappings. """
+
+        return [
+            to_field for (from_field, to_field, tz_aware) in
+                getattr(self, 'auto_updated_datetime_fields', [])
+        ]
+
+    @contextmanager
+    def _auto_now_suspended(self):
+        """
+        Context manager suspending `auto_now` on the destination fields of
+        auto updated datetime mappings, when `suspend_auto_now` is set.
+        """
+
+        if self.suspend_auto_now and self._get_auto_updated_fields():
+            with suspended_auto_now(self.to_model, self._get_auto_updated_fields()):
+                yield
+        else:
+            yield
+
+    def _set_auto_updated_datetimes(self, from_instance, to_instance):
+        """ Set auto updated datetimes on an object before it is saved. """
+
+        if hasattr(self, 'auto_updated_datetime_fields'):
+            for from_field, to_field, tz_aware in self.auto_updated_datetime_fields:
+                self.set_auto_updated_datetime(
+                    from_instance, to_instance, from_field, to_field, tz_aware
+                )
+
+    def _migrate_auto_updated_datetimes(self, from_instance, to_instance):
+        """ Migrate auto updated datetimes for a saved object. """
+
+        # These have been written along with the object itself
+        if self.suspend_auto_now:
+            return
 
-        # Migrate auto updated datetimes.
         if hasattr(self, 'auto_updated_datetime_fields'):
             for from_field, to_field, tz_aware in self.auto_updated_datetime_fields:
                 self.migrate_auto_updated_datetime(
                     from_instance, to_instance, from_field, to_field, tz_aware
                 )
 
+    def _migrate_from(self, from_instance):
+        to_instance = self._prepare_from(from_instance)
+
+        self.pre_save(from_instance, to_instance)
+
+        created = to_instance._state.adding
+
+        # Save to the database
+        with self._auto_now_suspended():
+            self._save(to_instance)
+
+        if created:
+            self._add_to_index(from_instance, to_instance)
+
+        # Migrate auto updated datetimes.
+        self._migrate_auto_updated_datetimes(from_instance, to_instance)
+
         self.post_save(from_instance, to_instance)
 
         return to_instance
 
+    def _save(self, to_instance):
+        """ Save a single object. """
+
+        to_instance.save(using=self.to_db)
+
+    def _write_new(self, to_instances):
+        """
+        Write a batch of new objects with a single `bulk_create()` or COPY,
+        see `writer`.
+        """
+
+        if self._get_copy_writer():
+            self._get_copy_writer().write(to_instances)
+        else:
+            self.to_model.objects.using(self.to_db).bulk_create(to_instances)
+
+    def _needs_saved_instances(self):
+        """
+        Whether anything has to be done with objects after they have been
+        saved, which requires them to have a primary key.
+        """
+
+        return (self._get_auto_updated_fields() and not self.suspend_auto_now) or \
+            self._overrides('post_save') or \
+            self._overrides('post_save_batch')
+
+    def _get_copy_writer(self):
+        """
+        Return the :class:`~writers.CopyWriter` used for writing new objects
+        in batched mode, or None when using bulk_create().
+        """
+
+        if not hasattr(self, '_copy_writer'):
+            self._copy_writer = None
+
+            if self.writer == 'copy':
+                self._copy_writer = CopyWriter(self.to_model, self.to_db)
+
+            elif self.writer == 'auto' and \
+                    connections[self.to_db].vendor == 'postgresql' and \
+                    not self.to_model._meta.parents and \
+                    not self._needs_saved_instances():
+                self._copy_writer = CopyWriter(self.to_model, self.to_db)
+
+        return self._copy_writer
+
+    def _migrate_batch(self, from_instances):
+        """
+        Migrate a batch of objects, writing all new objects with a single
+        `bulk_create()` or COPY, see `writer`, rather than saving them one by
+        one. Objects which already exist in the destination database are
+        saved individually.
+
+        Returns a list of `(from_instance, to_instance)` tuples.
+        """
+
+        self._pending_instances = []
+
+        self._prefetch_to(from_instances)
+
+        pairs = zip(from_instances, self._prepare_batch(from_instances))
+
+        self.validate_batch(self._pending_instances)
+
+        self.pre_save_batch(pairs)
+
+        with self._auto_now_suspended():
+            new_pairs = []
+            for (from_instance, to_instance) in pairs:
+                if to_instance._state.adding:
+                    new_pairs.append((from_instance, to_instance))
+                else:
+                    self._save(to_instance)
+
+            new_instances = [to_instance for (from_instance, to_instance) in new_pairs]
+
+            if new_instances:
+                self._write_new(new_instances)
+
+        # bulk_create() leaves the instance state untouched
+        for (from_instance, to_instance) in new_pairs:
+            to_instance._state.adding = False
+            to_instance._state.db = self.to_db
+
+            self._add_to_index(from_instance, to_instance)
+
+        self._pending_instances = ()
+        self._to_prefetched = {}
+
+        # Objects which need work after saving have to know their pk, which
+        # bulk_create() does not set for auto-generated keys.
+        if self._needs_saved_instances():
+            for to_instance in new_instances:
+                if to_instance.pk is None:
+                    raise Exception(
+                        u"Object '%s' has no primary key after bulk insert, "
+                        u"map the primary key or disable batched mode." %
+                            unicode(to_instance)
+                    )
+
+        for (from_instance, to_instance) in pairs:
+            self._migrate_auto_updated_datetimes(from_instance, to_instance)
+
+        self.post_save_batch(pairs)
+
+        return pairs
+
     def pre_validate(self, from_instance, to_instance):
         """
         Gets called before the to_instance is validated so that any information
@@ -387,6 +1343,26 @@ class MigrateModel(object):
         """
         pass
 
+    def pre_save_batch(self, pairs):
+        """
+        Gets called in batched mode before a batch of objects is written, with
+        a list of `(from_instance, to_instance)` tuples. By default
+        :meth:`pre_save` is called for every tuple.
+        """
+
+        for (from_instance, to_instance) in pairs:
+            self.pre_save(from_instance, to_instance)
+
+    def post_save_batch(self, pairs):
+        """
+        Gets called in batched mode after a batch of objects has been written,
+        with a list of `(from_instance, to_instance)` tuples. By default
+        :meth:`post_save` is called for every tuple.
+        """
+
+        for (from_instance, to_instance) in pairs:
+            self.post_save(from_instance, to_instance)
+
     def make_datetime_timezone_aware(self, datetime):
         """
         Converts the datetime to a timezone aware datetime.
@@ -404,22 +1380,55 @@ class MigrateModel(object):
 
         return tz_aware_datetime
 
-    def migrate_auto_updated_datetime(self, from_instance, to_instance, from_field, to_field, tz_aware):
+    def _get_auto_updated_datetime(self, from_instance, from_field, tz_aware):
         """
-        Migrate an auto updated datetime field with custom SQL. This is needed
-        because auto updated datetimes can't be set within Django.
+        Return the value for an auto updated datetime field, or None when the
+        old value is not set.
         """
 
         # Get the old auto updated value.
         from_datetime = getattr(from_instance, from_field)
         if from_datetime is None:
-            return
+            return None
         assert isinstance(from_datetime, datetime)
 
         if tz_aware:
-            to_datetime = self.make_datetime_timezone_aware(from_datetime)
+            return self.make_datetime_timezone_aware(from_datetime)
+
+        return from_datetime
+
+    def set_auto_updated_datetime(self, from_instance, to_instance, from_field, to_field, tz_aware=True):
+        """
+        Set an auto updated datetime field on an object which is yet to be
+        saved with `auto_now` suspended for the field, so the value is written
+        along with the object.
+        """
+
+        to_datetime = self._get_auto_updated_datetime(
+            from_instance, from_field, tz_aware
+        )
+
+        if to_datetime is None:
+            # Set the value Django itself would have generated.
+            field = to_instance._meta.get_field(to_field)
+            field.pre_save(to_instance, to_instance._state.adding)
+
         else:
-            to_datetime = from_datetime
+            setattr(to_instance, to_field, to_datetime)
+
+    def migrate_auto_updated_datetime(self, from_instance, to_instance, from_field, to_field, tz_aware):
+        """
+        Migrate an auto updated datetime field with custom SQL. This is needed
+        because auto updated datetimes can't be set within Django, unless
+        `suspend_auto_now` is used.
+        """
+
+        to_datetime = self._get_auto_updated_datetime(
+            from_instance, from_field, tz_aware
+        )
+
+        if to_datetime is None:
+            return
 
         to_model = to_instance.__class__
 
@@ -442,7 +1451,364 @@ class MigrateModel(object):
             for command in sequence_sql:
                 cursor.execute(command)
 
-    def migrate_all(self, debug_sql):
+    def _collect_auto_updated_fields(self):
+        """
+        Collect auto updated datetime fields, which are migrated after the
+        model has been saved by django.
+        """
+
+        for (field, mapping) in self._get_mappings():
+            if isinstance(mapping, AutoUpdatedDateTimeMapping):
+                self.auto_updated_datetime_fields.append((field, mapping.get_to_field(field), mapping.tz_aware))
+                continue
+
+            # We also need to take care of auto updated datetime fields that are in OneToManyMappings.
+            if isinstance(mapping, OneToManyMapping):
+                for otm_mapping in mapping.mappings:
+                    if isinstance(otm_mapping, AutoUpdatedDateTimeMapping):
+                        self.auto_updated_datetime_fields.append((field, otm_mapping.get_to_field(field), otm_mapping.tz_aware))
+
+    def _split_repeated_keys(self, from_instances):
+        """
+        Split `from_instances` into lists of consecutive objects with distinct
+        correspondence keys, so objects sharing a key with an earlier object
+        in the batch update the object created for it rather than creating
+        another.
+        """
+
+        # Custom lookups do not tell their keys
+        if self._overrides('get_to'):
+            return [from_instances]
+
+        parts = [[]]
+        keys = set()
+
+        for from_instance in from_instances:
+            key = self._get_to_key(from_instance)
+
+            if key in keys:
+                parts.append([])
+                keys = set()
+
+            keys.add(key)
+            parts[-1].append(from_instance)
+
+        return parts
+
+    def _migrate_objects(self, from_instances, debug_sql):
+        """ Migrate a list of objects, batched or one by one. """
+
+        if self.batch_size:
+            if debug_sql:
+                time.sleep(1)
+
+            for part in self._split_repeated_keys(from_instances):
+                self._migrate_batch(part)
+
+        else:
+            # Looked up for all objects at once, rather than one by one
+            self._prefetch_to(from_instances)
+
+            try:
+                for from_instance in from_instances:
+                    # Add a sleep statement so the asychronous SQL debug statements
+                    # are in the right place. This should be ok because we're only
+                    # using this for debugging.
+                    if debug_sql:
+                        time.sleep(1)
+
+                    self._migrate_from(from_instance)
+
+            finally:
+                self._to_prefetched = {}
+
+    def _get_migration_name(self):
+        """ Return the full import path of the migration class. """
+
+        return '%s.%s' % (self.__class__.__module__, self.__class__.__name__)
+
+    def _get_checkpoint(self, resume):
+        """
+        Return the checkpoint for this migration, reset unless an unfinished
+        migration is to be resumed.
+        """
+
+        name = self._get_migration_name()
+
+        (checkpoint, created) = MigrationCheckpoint.objects.using(self.to_db).get_or_create(
+            migration=name, defaults={'started': timezone.now()}
+        )
+
+        if resume and checkpoint.finished:
+            logger.info(u'Previous run of %s has finished, starting over.', name)
+
+        if not resume or checkpoint.finished:
+            checkpoint.last_pk = ''
+            checkpoint.migrated = 0
+            checkpoint.batches = 0
+            checkpoint.elapsed = 0
+            checkpoint.started = timezone.now()
+            checkpoint.finished = False
+
+        return checkpoint
+
+    def _list_from_changed(self, from_qs, checkpoint):
+        """
+        Return the source objects which changed since the last successful
+        incremental run according to `change_field`, along with the new
+        watermark to record once this run has succeeded.
+        """
+
+        field = from_qs.model._meta.get_field(self.change_field)
+
+        watermark = from_qs.aggregate(
+            watermark=Max(self.change_field)
+        )['watermark']
+
+        if checkpoint.watermark:
+            # Objects changed at exactly the watermark are migrated again,
+            # which is harmless and safe against changes within the same tick.
+            from_qs = from_qs.filter(**{
+                '%s__gte' % self.change_field:
+                    field.to_python(checkpoint.watermark)
+            })
+
+            logger.info(
+                u"Migrating objects with '%s' since %s.",
+                self.change_field, checkpoint.watermark
+            )
+
+        return (from_qs, watermark)
+
+    def _get_row_digest(self, from_instance):
+        """ Return a digest of the content of a source object. """
+
+        values = tuple(
+            field.value_from_object(from_instance)
+            for field in from_instance._meta.fields
+        )
+
+        return hashlib.sha1(repr(values)).hexdigest()
+
+    def _select_changed(self, from_instances):
+        """
+        Return the objects among `from_instances` whose digest differs from
+        the one stored during a previous run, along with a dictionary of
+        their new digests by pk.
+        """
+
+        pks = [unicode(from_instance.pk) for from_instance in from_instances]
+
+        stored = dict(
+            RowDigest.objects.using(self.to_db).filter(
+                migration=self._get_migration_name(), source_pk__in=pks
+            ).values_list('source_pk', 'digest')
+        )
+
+        changed = []
+        digests = {}
+
+        for (pk, from_instance) in zip(pks, from_instances):
+            digest = self._get_row_digest(from_instance)
+
+            if stored.get(pk) != digest:
+                changed.append(from_instance)
+                digests[pk] = (digest, pk in stored)
+
+        return (changed, digests)
+
+    def _store_digests(self, digests):
+        """ Store digests returned by :meth:`_select_changed`. """
+
+        name = self._get_migration_name()
+        digest_qs = RowDigest.objects.using(self.to_db)
+
+        digest_qs.bulk_create([
+            RowDigest(migration=name, source_pk=pk, digest=digest)
+            for (pk, (digest, stored)) in digests.iteritems()
+            if not stored
+        ])
+
+        for (pk, (digest, stored)) in digests.iteritems():
+            if stored:
+                digest_qs.filter(migration=name, source_pk=pk).update(digest=digest)
+
+    def _migrate_batches(self, from_qs, debug_sql, checkpoint=None):
+        """
+        Migrate all objects in `from_qs` batch by batch and return the number
+        of objects migrated.
+
+        When a `checkpoint` is given, the migration continues after the last
+        batch recorded in it and every batch is committed along with the
+        updated checkpoint.
+        """
+
+        counter = 0
+        after_pk = None
+
+        ordered = isinstance(from_qs, QuerySet) and bool(get_ordering(from_qs))
+
+        if checkpoint is not None and ordered:
+            logger.warning(
+                u'Committing batches of %s requires primary key order, ignoring the ordering %s.',
+                self, get_ordering(from_qs)
+            )
+
+            from_qs = from_qs.order_by('pk')
+            ordered = False
+
+        if checkpoint is not None and checkpoint.last_pk:
+            after_pk = from_qs.model._meta.pk.to_python(checkpoint.last_pk)
+            counter = checkpoint.migrated
+
+            logger.info(
+                u'Resuming after pk %s, %d objects have been migrated before.',
+                after_pk, counter
+            )
+
+        # Without a change field, incremental runs compare digests
+        use_digests = self.incremental and not self.change_field
+
+        batch_verifier = None
+
+        if self.verify_batches:
+            if checkpoint is None:
+                logger.warning(
+                    u'Batches are only verified while migrating when committing batches.'
+                )
+
+            else:
+                # Resolved once, before the verifier starts using it
+                self._list_to()
+
+                batch_verifier = BatchVerifier(self, self.max_errors)
+                batch_verifier.start()
+
+        progress = Progress(
+            u'Migrating %s' % self,
+            count_objects(from_qs, self.estimate_counts),
+            done=counter
+        )
+
+        initial_counter = counter
+
+        # Batches can only be resized by continuing after the last object
+        resizable = isinstance(from_qs, QuerySet) and from_qs.query.can_filter() and \
+            not ordered
+
+        try:
+            with Measurement() as measurement:
+                while True:
+                    for batch in self._iter_from_batches(from_qs, after_pk):
+                        started = time.time()
+                        last_pk = batch[-1].pk
+
+                        if use_digests:
+                            (batch, digests) = self._select_changed(batch)
+
+                        self._migrate_objects(batch, debug_sql)
+
+                        if use_digests:
+                            self._store_digests(digests)
+
+                        counter += len(batch)
+
+                        if checkpoint is not None:
+                            checkpoint.last_pk = unicode(last_pk)
+                            checkpoint.migrated = counter
+                            checkpoint.batches += 1
+                            checkpoint.elapsed += time.time() - started
+                            checkpoint.save(using=self.to_db)
+
+                            transaction.commit(using=self.to_db)
+
+                        # Verified on another connection, while the next batch
+                        # is being migrated
+                        if batch_verifier:
+                            batch_verifier.submit(batch)
+
+                        progress.add(len(batch))
+
+                        after_pk = last_pk
+
+                        if self._release_memory(resizable):
+                            # Continue after this batch with smaller batches
+                            break
+
+                    else:
+                        break
+
+        except:
+            if batch_verifier:
+                batch_verifier.stop()
+
+            raise
+
+        if batch_verifier:
+            batch_verifier.finish()
+
+        measurement.rows = counter - initial_counter
+
+        logger.info(u'Migration performed in %s.', measurement)
+
+        return counter
+
+    def _migrate_pushdown(self, from_qs):
+        """
+        Migrate all objects in `from_qs` with a single `INSERT ... SELECT`
+        when possible. Returns the number of objects migrated, or None when
+        the objects should be migrated in Python.
+        """
+
+        if not self.sql_pushdown or not isinstance(from_qs, QuerySet):
+            return None
+
+        if self.incremental:
+            logger.info(u'Migrating %s in Python as it is incremental.', self)
+            return None
+
+        overridden = [name for name in self._pushdown_hooks if self._overrides(name)]
+        if overridden:
+            logger.info(
+                u'Migrating %s in Python as it overrides %s.',
+                self, u', '.join(overridden)
+            )
+
+            return None
+
+        with Measurement() as measurement:
+            counter = migrate_pushdown(self, from_qs)
+
+        if counter is not None:
+            measurement.rows = counter
+
+            logger.info(u'Migration performed in SQL in %s.', measurement)
+
+        return counter
+
+    def _test_migration(self, from_qs, workers=None):
+        """
+        Run the integrity tests, returns True on success. With `workers`,
+        the objects are tested in this number of processes, which requires
+        the migrated objects to have been committed.
+        """
+
+        logger.info(u'Starting integrity tests.')
+
+        # Objects created during the migration are looked up again
+        self._reset_to_index()
+
+        # Passed on like this, as test_multiple() is overridden by migrations
+        self._test_workers = workers
+
+        with Measurement() as measurement:
+            success = self.test_multiple(from_qs)
+
+        logger.info(u'Integrity tests completed in %s.', measurement)
+
+        return success
+
+    def migrate_all(self, debug_sql, resume=False, workers=None):
         """
         Migrate all the objects returned by list_from().
 
@@ -453,7 +1819,8 @@ class MigrateModel(object):
         2. Log warnings for fields which are not explicitly mapped.
         3. Start a transaction.
         4. Migrate all the individual objects from the source queryset
-           by calling :meth:`_migrate_from`.
+           by calling :meth:`_migrate_from` or, when `batch_size` is set, in
+           batches by calling :meth:`_migrate_batch`.
         5. Perform integrity tests by calling :meth:`test_multiple` on the
            migrated queryset and raise an exception if any of the tests have
            failed.
@@ -461,9 +1828,142 @@ class MigrateModel(object):
         7. Manually update the sequence counter for the target database table
            so new primary keys are generated properly after the migration.
 
+        When `incremental` is set, only source objects which changed since the
+        last successful run are migrated, see :ref:`incremental-migrations`.
+
+        With `sql_pushdown`, all objects are migrated with a single
+        `INSERT ... SELECT` instead where possible, see :ref:`sql-pushdown`.
+
+        When `commit_batches` is set or `resume` is given, every batch is
+        committed along with a :class:`~models.MigrationCheckpoint` instead,
+        and the integrity tests are performed on the committed result. With
+        `resume`, the migration continues after the last committed batch of
+        an unfinished previous run.
+
+        When more than one of `workers` is given, the source queryset is split
+        into primary key ranges which are migrated and committed in parallel
+        by separate processes, after which the integrity tests are performed
+        on the combined result.
+
         During the process this method will print out timing information for
         the migration and testing process and will give out progress reports
-        for every 50 objects migrated.
+        for every batch of objects migrated. With `profile`, the time spent
+        per phase and per field mapping is reported afterwards.
+        """
+
+        if self.profile:
+            self._start_profiling()
+
+        if self.memo_size:
+            self._start_memoizing()
+
+        try:
+            with Measurement() as measurement:
+                measurement.rows = self._migrate_all(debug_sql, resume, workers)
+
+        finally:
+            if self._memos:
+                self._stop_memoizing()
+
+            if self._profiler:
+                self._stop_profiling()
+
+            self._clear_caches()
+
+        logger.info(
+            u'Migration %s complete in %s.', self.__class__.__name__, measurement
+        )
+
+    def _start_profiling(self):
+        """ Start timing the phases of the migration and the field mappings. """
+
+        self._profiler = Profiler()
+
+        # Instance attributes take precedence over the methods of the class,
+        # which are still used for checking whether methods are overridden.
+        for name in self._profiled_phases:
+            setattr(self, name, self._profiler.wrap('phase', name, getattr(self, name)))
+
+        # Rebuilt with timed steps
+        self._reset_plans()
+
+    def _stop_profiling(self):
+        """ Report the timings and stop profiling. """
+
+        self._profiler.report(unicode(self))
+
+        if self.profile_json:
+            path = self.profile_json
+            if '%s' in path:
+                path = path % self.__class__.__name__
+
+            self._profiler.dump(path)
+
+            logger.info(u'Profile written to %s.', path)
+
+        for name in self._profiled_phases:
+            delattr(self, name)
+
+        self._reset_plans()
+
+        self._profiler = None
+
+    def _start_memoizing(self):
+        """
+        Cache the results of the `map_value()` method of all pure mappings,
+        keeping at most `memo_size` results per mapping.
+        """
+
+        memos = []
+
+        for (field, mapping) in self._get_mappings():
+            for nested_mapping in mapping.iter_mappings():
+                # Mappings can be shared, but are only cached once
+                if not isinstance(nested_mapping, IdentityMapping) or \
+                        not nested_mapping.is_pure() or \
+                        'map_value' in nested_mapping.__dict__:
+                    continue
+
+                cache = LRUCache(nested_mapping.map_value, self.memo_size)
+                nested_mapping.map_value = cache
+
+                memos.append((field, nested_mapping, cache))
+
+        self._memos = memos
+
+        # Rebuilt with cached steps
+        self._reset_plans()
+
+    def _stop_memoizing(self):
+        """ Report the hits and misses of the caches and stop caching. """
+
+        for (field, mapping, cache) in self._memos:
+            calls = cache.hits + cache.misses
+
+            if calls:
+                logger.info(
+                    u"Cache of %s for '%s': %d hits, %d misses (%.1f%% hits), %d values cached.",
+                    mapping, field, cache.hits, cache.misses,
+                    100.0 * cache.hits / calls, len(cache.cache)
+                )
+
+            del mapping.map_value
+
+        self._memos = ()
+
+        self._reset_plans()
+
+    def _reset_plans(self):
+        """ Drop the compiled mapping plans, so they are compiled again. """
+
+        for name in ('_mapping_plan', '_batch_plan'):
+            if hasattr(self, name):
+                delattr(self, name)
+
+    def _migrate_all(self, debug_sql, resume, workers):
+        """
+        Perform the migration, see :meth:`migrate_all`. Returns the number
+        of objects migrated.
         """
 
         logger.info(u"Starting '<%s>'", unicode(self))
@@ -471,8 +1971,6 @@ class MigrateModel(object):
         # Grab a qs of object to migrate
         from_qs = self._list_from()
 
-        counter = 0
-
         # Check whether all fields are properly mapped and issue
         # a warning if this is not the case.
         from_fields = from_qs.model._meta.get_all_field_names()
@@ -483,59 +1981,80 @@ class MigrateModel(object):
                     u"Field '%s' is not mapped and will be thrown away. To get rid of this warning, please map the field to `None` to throw away the data.",
                     from_field
                 )
-        # Execute all of this within a single transaction
-        with transaction.commit_on_success():
-
-            with Timer() as t:
-                # Deal with saving the auto-updated fields before the migrations.
-                for field in self.field_mapping.iterkeys():
-                    # Get the mapping
-                    mapping = self.get_mapping(field)
-
-                    # Save the migration of auto updated datetime fields after the model has been saved by django.
-                    if isinstance(mapping, AutoUpdatedDateTimeMapping):
-                        self.auto_updated_datetime_fields.append((field, mapping.get_to_field(field), mapping.tz_aware))
-                        continue
-
-                    # We also need to take care of auto updated datetime fields that are in OneToManyMappings.
-                    if isinstance(mapping, OneToManyMapping):
-                        for otm_mapping in mapping.mappings:
-                            if isinstance(otm_mapping, AutoUpdatedDateTimeMapping):
-                                self.auto_updated_datetime_fields.append((field, otm_mapping.get_to_field(field), otm_mapping.tz_aware))
-
-                # Iterate over all instances
-                for from_instance in from_qs.all():
-                    # Add a sleep statement so the asychronous SQL debug statements
-                    # are in the right place. This should be ok because we're only
-                    # using this for debugging.
-                    if debug_sql:
-                        time.sleep(1)
 
-                    self._migrate_from(from_instance)
+        # Deal with saving the auto-updated fields before the migrations.
+        self._collect_auto_updated_fields()
+
+        checkpoint = None
+        if self.commit_batches or resume or self.incremental:
+            checkpoint = self._get_checkpoint(resume)
 
-                    counter += 1
+        # Objects to migrate, the integrity tests always cover all of from_qs
+        changed_qs = from_qs
+        watermark = None
 
-                    # Print a progress message very 50 objects
-                    if (counter % 50) == 0:
-                        logger.info(u'%d of %d objects migrated', counter, from_qs.count())
+        if self.incremental and self.change_field:
+            (changed_qs, watermark) = self._list_from_changed(from_qs, checkpoint)
 
-            logger.info(u'Migration performed in %.03f seconds.', t.interval)
-            logger.info(u'Starting integrity tests.')
+        if workers and workers > 1:
+            if self.commit_batches or resume:
+                raise Exception(
+                    'Checkpoints are not supported when using multiple workers.'
+                )
+
+            # Workers can't see the objects other workers have not committed
+            if isinstance(self, UniqueSlugMixin):
+                raise Exception(
+                    'Unique slugs are not supported when using multiple workers.'
+                )
+
+            if self._overrides('migrate_single'):
+                logger.warning(
+                    u'%s overrides migrate_single(), which does not see objects migrated by other workers.',
+                    self
+                )
+
+            counter = migrate_parallel(self, changed_qs, workers, debug_sql)
+
+            if not self._test_migration(from_qs, workers):
+                raise Exception('Integrity tests failed, migrated objects have been committed.')
+
+        elif self.commit_batches or resume:
+            with transaction.commit_manually(using=self.to_db):
+                try:
+                    counter = self._migrate_batches(changed_qs, debug_sql, checkpoint)
+
+                except:
+                    transaction.rollback(using=self.to_db)
+                    raise
 
-            with Timer() as t:
-                if not self.test_multiple(from_qs):
+            if not self._test_migration(from_qs):
+                raise Exception('Integrity tests failed, migrated objects have been committed.')
+
+        else:
+            # Execute all of this within a single transaction
+            with transaction.commit_on_success():
+                counter = self._migrate_pushdown(changed_qs)
+
+                if counter is None:
+                    counter = self._migrate_batches(changed_qs, debug_sql)
+
+                if not self._test_migration(from_qs):
                     raise Exception('Integrity tests failed, not committing changes.')
 
-            logger.info(
-                u'Integrity tests completed in %.03f seconds.',
-                t.interval
-            )
+        if checkpoint is not None:
+            checkpoint.finished = True
+
+            if watermark is not None:
+                checkpoint.watermark = unicode(watermark)
+
+            checkpoint.save(using=self.to_db)
 
         self._update_pk_sequence()
 
         logger.info(u'%d objects migrated', counter)
 
-        logger.info(u'Migration %s complete.', self.__class__.__name__)
+        return counter
 
 
 class UniqueSlugMixin(object):
@@ -569,10 +2088,17 @@ class UniqueSlugMixin(object):
         # Make sure we exclude the current object
         qs = self._list_to().exclude(pk=to_instance.pk)
 
+        # Slugs of objects in the current batch are not in the database yet
+        pending_slugs = set(
+            self._get_slug(instance) for instance in self._pending_instances
+            if instance is not to_instance
+        )
+
         # Detect and change duplicate slug
         original_slug = self._get_slug(to_instance)
 
-        while qs.filter(**{self.slug_field: self._get_slug(to_instance)}).exists():
+        while self._get_slug(to_instance) in pending_slugs or \
+                qs.filter(**{self.slug_field: self._get_slug(to_instance)}).exists():
             to_instance.slug = '%s-%d' % (original_slug, counter)
 
             # From Margreet: Don't display this warning for duplicate organizations.
@@ -2,10 +2,13 @@ import logging
 
 from optparse import make_option
 
-from django.core.management.base import BaseCommand
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
 
 from ...settings import MIGRATIONS, DEBUG_MIGRATIONS
-from ...utils import get_migration
+from ...utils import get_migration, counting_queries
+from ...scheduler import run_scheduled
+from ...verification import get_sample_size
 
 
 class Command(BaseCommand):
@@ -34,6 +37,118 @@ class Command(BaseCommand):
             dest='debugsql',
             default=False,
             help='Display the SQL statements that Django executes.'),
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=None,
+            help='Write migrated objects in batches of this size.'),
+        make_option('--writer',
+            action='store',
+            type='choice',
+            choices=['auto', 'bulk', 'copy'],
+            dest='writer',
+            default=None,
+            help='Write batches with bulk_create() or COPY (auto, bulk, copy).'),
+        make_option('--lightweight-rows',
+            action='store_true',
+            dest='lightweight_rows',
+            default=False,
+            help='Read source objects as lightweight rows instead of model instances.'),
+        make_option('--validation',
+            action='store',
+            type='choice',
+            choices=['full', 'fast', 'none'],
+            dest='validation',
+            default=None,
+            help='Validate objects with full_clean(), in batches or not at all (full, fast, none).'),
+        make_option('--validation-sample',
+            action='store',
+            type='int',
+            dest='validation_sample',
+            default=None,
+            help='Validate only one in this number of objects.'),
+        make_option('--verify',
+            action='store',
+            dest='verify',
+            default=None,
+            help='Test every object, compare digests of ranges of objects or test a sample (merge, digest, sample:<fraction or count>).'),
+        make_option('--verify-seed',
+            action='store',
+            type='int',
+            dest='verify_seed',
+            default=None,
+            help='Seed for selecting the objects to test with --verify=sample.'),
+        make_option('--verify-batches',
+            action='store_true',
+            dest='verify_batches',
+            default=False,
+            help='Verify every committed batch in the background while migrating.'),
+        make_option('--max-errors',
+            action='store',
+            type='int',
+            dest='max_errors',
+            default=None,
+            help='Abort when more objects than this fail verification of batches.'),
+        make_option('--profile',
+            action='store_true',
+            dest='profile',
+            default=False,
+            help='Report the time spent per phase and per field mapping.'),
+        make_option('--profile-json',
+            action='store',
+            dest='profile_json',
+            default=None,
+            help="Write profiles as JSON to this path, '%s' is replaced by the migration."),
+        make_option('--sql-pushdown',
+            action='store_true',
+            dest='sql_pushdown',
+            default=False,
+            help='Migrate with a single INSERT ... SELECT where possible.'),
+        make_option('--memo-size',
+            action='store',
+            type='int',
+            dest='memo_size',
+            default=None,
+            help='Number of results of pure mappings to cache per mapping, 0 disables caching.'),
+        make_option('--memory-budget',
+            action='store',
+            type='int',
+            dest='memory_budget',
+            default=None,
+            help='Shrink batches when the process uses more megabytes of memory than this.'),
+        make_option('--commit-batches',
+            action='store_true',
+            dest='commit_batches',
+            default=False,
+            help='Commit every batch along with a checkpoint.'),
+        make_option('--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help='Resume after the last batch committed by a previous run.'),
+        make_option('--incremental',
+            action='store_true',
+            dest='incremental',
+            default=False,
+            help='Only migrate objects changed since the last successful run.'),
+        make_option('--workers',
+            action='store',
+            type='int',
+            dest='workers',
+            default=None,
+            help='Migrate every model using this number of processes.'),
+        make_option('--jobs',
+            action='store',
+            type='int',
+            dest='jobs',
+            default=None,
+            help='Run independent migrations concurrently in this number of processes.'),
+        make_option('--isolate',
+            action='store_true',
+            dest='isolate',
+            default=False,
+            help='Run every migration in a process forked from a preloaded parent.'),
         )
 
 
@@ -41,22 +156,121 @@ class Command(BaseCommand):
         """ Run a single migration. """
 
         migration_instance = get_migration(migration)
-        migration_instance.migrate_all(debug_sql)
+
+        if self.options.get('batch_size'):
+            migration_instance.batch_size = self.options['batch_size']
+
+        if self.options.get('writer'):
+            migration_instance.writer = self.options['writer']
+
+        if self.options.get('lightweight_rows'):
+            migration_instance.lightweight_rows = True
+
+        if self.options.get('validation'):
+            if self.options['validation'] == 'none':
+                migration_instance.validation = None
+            else:
+                migration_instance.validation = self.options['validation']
+
+        if self.options.get('validation_sample'):
+            migration_instance.validation_sample = self.options['validation_sample']
+
+        if self.options.get('verify'):
+            migration_instance.verify = self.options['verify']
+
+        if self.options.get('verify_seed') is not None:
+            migration_instance.verify_seed = self.options['verify_seed']
+
+        if self.options.get('verify_batches'):
+            migration_instance.verify_batches = True
+
+        if self.options.get('max_errors') is not None:
+            migration_instance.max_errors = self.options['max_errors']
+
+        if self.options.get('profile') or self.options.get('profile_json'):
+            migration_instance.profile = True
+
+        if self.options.get('profile_json'):
+            migration_instance.profile_json = self.options['profile_json']
+
+        if self.options.get('sql_pushdown'):
+            migration_instance.sql_pushdown = True
+
+        if self.options.get('memo_size') is not None:
+            migration_instance.memo_size = self.options['memo_size']
+
+        if self.options.get('memory_budget'):
+            migration_instance.memory_budget = self.options['memory_budget']
+
+        if self.options.get('commit_batches'):
+            migration_instance.commit_batches = True
+
+        if self.options.get('incremental'):
+            migration_instance.incremental = True
+
+        migration_instance.migrate_all(
+            debug_sql,
+            resume=self.options.get('resume', False),
+            workers=self.options.get('workers')
+        )
 
     def _run_migrations(self, debug_sql=False, *args):
         """ Run a series of migrations. """
 
-        for migration in MIGRATIONS:
-            # Execute all migrations, unless a set of migration classes
-            # have been specified on the command line
-            if not args or migration.rsplit('.', 1)[1] in args:
+        # Execute all migrations, unless a set of migration classes
+        # have been specified on the command line
+        migrations = [
+            migration for migration in MIGRATIONS
+            if not args or migration.rsplit('.', 1)[1] in args
+        ]
+
+        if self.options.get('jobs') or self.options.get('isolate'):
+            # Run every migration in a process of its own, concurrently when
+            # their dependencies allow for it
+            run_scheduled(
+                migrations,
+                lambda migration: self._run_migration(debug_sql, migration),
+                self.options.get('jobs') or 1
+            )
+
+        else:
+            for migration in migrations:
                 self._run_migration(debug_sql, migration)
 
     def handle(self, *args, **options):
+        self.options = options
+
+        if options.get('workers') and \
+                (options.get('resume') or options.get('commit_batches')):
+            raise CommandError(
+                '--workers cannot be combined with --resume or --commit-batches.'
+            )
+
+        verify = options.get('verify')
+        if verify and verify not in ('merge', 'digest'):
+            try:
+                if get_sample_size(verify) is None:
+                    raise CommandError(
+                        "--verify should be 'merge', 'digest' or 'sample:<fraction or count>'."
+                    )
+            except ImproperlyConfigured as e:
+                raise CommandError(unicode(e))
+
         # Setup the log level for root logger
         loglevel = self.verbosity_loglevel.get(options['verbosity'])
         logging.getLogger().setLevel(loglevel)
 
+        # Count queries for the timings and progress reported, also without
+        # DEBUG, but only when these are logged
+        if logging.getLogger('legacymigrations').isEnabledFor(logging.INFO):
+            with counting_queries():
+                self._handle(options, *args)
+        else:
+            self._handle(options, *args)
+
+    def _handle(self, options, *args):
+        """ Run the migrations with the log level set up. """
+
         # from debugsqlshell
         if options['debugsql']:
             from datetime import datetime
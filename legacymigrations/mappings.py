@@ -7,6 +7,8 @@ from surlex import Surlex
 
 from decimal import Decimal
 
+from operator import attrgetter
+
 from os import path
 
 from pytz.exceptions import AmbiguousTimeError
@@ -15,17 +17,104 @@ from datetime import datetime
 
 from django.utils import timezone
 from django.core.files import File
+from django.db.models import CharField, TextField, IntegerField
 from django.template.defaultfilters import slugify
 
 
 class Mapping(object):
     """ Base class for mappings. """
 
+    # Whether map_batch() maps whole batches of objects at once. Migrations
+    # map fields of other mappings object by object.
+    vectorized = False
+
     def __call__(self, instance, from_field):
         """ Just wrap to a more verbose map function. """
 
         return self.map(instance, from_field)
 
+    def compile(self, from_field):
+        """
+        Return a list of steps performing this mapping for `from_field`. Each
+        step is a callable taking `(from_instance, to_instance)` and setting
+        the mapped values on `to_instance`.
+
+        Migrations compile their mappings once, so subclasses can return
+        specialized steps avoiding per-object overhead.
+        """
+
+        mapping = self
+
+        def step(from_instance, to_instance):
+            value_dict = mapping(from_instance, from_field)
+
+            assert isinstance(value_dict, dict), \
+                u'Mapping %s returned %s instead of a dict.' % \
+                    (mapping, value_dict)
+
+            for (new_field, new_value) in value_dict.iteritems():
+                assert isinstance(new_field, basestring)
+
+                setattr(to_instance, new_field, new_value)
+
+        return [step]
+
+    def iter_mappings(self):
+        """ Yield this mapping and all mappings nested in it. """
+
+        yield self
+
+    def map_batch(self, from_instances, from_field):
+        """
+        Return a list of `(to_field, values)` tuples, where `values` holds
+        the mapped value for every object in `from_instances`. Only used for
+        mappings which are `vectorized`.
+        """
+
+        raise NotImplementedError
+
+    def check_batch(self, from_instances, to_instances, from_field):
+        """
+        Return a list with the result of `check()` for every pair of objects
+        in `from_instances` and `to_instances`.
+        """
+
+        return [
+            self.check(from_instance, to_instance, from_field)
+            for (from_instance, to_instance) in zip(from_instances, to_instances)
+        ]
+
+    def as_sql(self, from_field, column, get_field):
+        """
+        Return a list of `(to_field, sql, params)` tuples performing this
+        mapping for `from_field` as SQL expressions, for migrating with a
+        single `INSERT ... SELECT`. `column` returns the quoted column of a
+        field of the source model by name and `get_field` the field itself.
+
+        Returns None when the mapping cannot be expressed in SQL, which is the
+        default.
+        """
+
+        return None
+
+    def has_side_effects(self):
+        """
+        Whether mapping objects may do more than compute values from the
+        source object, like querying related objects or reading files, so it
+        cannot be repeated safely when verifying. Assumed by default.
+        """
+
+        return True
+
+    def reset(self):
+        """
+        Drop any state cached while mapping or checking objects. Called
+        after every batch and after the migration, to keep memory use of
+        long running migrations bounded. Override this when caching.
+        """
+
+        pass
+
     def __repr__(self):
         return u'<%s>' % self.__class__.__name__
 
@@ -36,6 +125,21 @@ class NullMapping(Mapping):
     def map(self, instance, from_field):
         return {}
 
+    def compile(self, from_field):
+        if type(self).map.im_func is not NullMapping.map.im_func:
+            return super(NullMapping, self).compile(from_field)
+
+        return []
+
+    def as_sql(self, from_field, column, get_field):
+        if type(self).map.im_func is not NullMapping.map.im_func:
+            return None
+
+        return []
+
+    def has_side_effects(self):
+        return type(self).map.im_func is not NullMapping.map.im_func
+
     def check(self, from_instance, to_instance, from_field):
         return True
 
@@ -51,6 +155,11 @@ class IdentityMapping(Mapping):
     as part of their function should set this to False.
     """
 
+    # Whether map_value() is a pure function of the value it is given, so
+    # migrations can cache its results. Only holds for the class declaring
+    # it, see is_pure().
+    pure = False
+
     def __init__(self, to_field=None, reportDataChanges=True):
         self.to_field = to_field
         self.reportDataChanges = reportDataChanges
@@ -84,6 +193,151 @@ class IdentityMapping(Mapping):
 
         return {self.get_to_field(from_field): new_value}
 
+    def compile(self, from_field):
+        """
+        Assign the mapped value directly, without building a dict, unless
+        a subclass overrides :meth:`map`.
+        """
+
+        if type(self).map.im_func is not IdentityMapping.map.im_func:
+            return super(IdentityMapping, self).compile(from_field)
+
+        to_field = self.get_to_field(from_field)
+
+        if type(self) is IdentityMapping:
+            # Plain copy, which never changes the value
+            def step(from_instance, to_instance):
+                setattr(to_instance, to_field, getattr(from_instance, from_field))
+
+            return [step]
+
+        map_value = self.map_value
+        log_change = self.log_change
+
+        def step(from_instance, to_instance):
+            old_value = getattr(from_instance, from_field)
+            new_value = map_value(old_value)
+
+            log_change(from_field, from_instance, old_value, new_value)
+
+            setattr(to_instance, to_field, new_value)
+
+        return [step]
+
+    def is_pure(self):
+        """
+        Whether :meth:`map_value` is declared `pure` by the class defining it,
+        so subclasses overriding :meth:`map_value` do not inherit it.
+        """
+
+        for cls in type(self).__mro__:
+            if 'map_value' in cls.__dict__:
+                return cls.__dict__.get('pure', False)
+
+        return False
+
+    def _implements(self, name):
+        """
+        Whether every class overriding :meth:`map_value` also overrides the
+        method `name` performing the same mapping differently.
+        """
+
+        for cls in type(self).__mro__:
+            if 'map_value' in cls.__dict__ and name not in cls.__dict__:
+                return False
+
+        return True
+
+    @property
+    def vectorized(self):
+        return type(self).map.im_func is IdentityMapping.map.im_func
+
+    def map_values(self, old_values):
+        """
+        Return a list with :meth:`map_value` performed on every value in
+        `old_values`. Subclasses overriding :meth:`map_value` can override
+        this to map all values at once.
+        """
+
+        return list(old_values)
+
+    def _map_values(self, old_values):
+        """ Perform :meth:`map_values` when possible or map values one by one. """
+
+        if self._implements('map_values'):
+            return self.map_values(old_values)
+
+        return map(self.map_value, old_values)
+
+    def map_batch(self, from_instances, from_field):
+        old_values = map(attrgetter(from_field), from_instances)
+        new_values = self._map_values(old_values)
+
+        if type(self).map_value.im_func is not IdentityMapping.map_value.im_func:
+            for (from_instance, old_value, new_value) in \
+                    zip(from_instances, old_values, new_values):
+                self.log_change(from_field, from_instance, old_value, new_value)
+
+        return [(self.get_to_field(from_field), new_values)]
+
+    def check_batch(self, from_instances, to_instances, from_field):
+        if type(self).check.im_func is not IdentityMapping.check.im_func or \
+                type(self).check_value.im_func is not IdentityMapping.check_value.im_func:
+            return super(IdentityMapping, self).check_batch(
+                from_instances, to_instances, from_field
+            )
+
+        mapped_values = self._map_values(map(attrgetter(from_field), from_instances))
+        new_values = map(attrgetter(self.get_to_field(from_field)), to_instances)
+
+        return [
+            mapped_value == new_value
+            for (mapped_value, new_value) in zip(mapped_values, new_values)
+        ]
+
+    def value_as_sql(self, sql, params, field):
+        """
+        Return `(sql, params)` for an SQL expression performing
+        :meth:`map_value` on the value of the expression `sql`, or None when
+        this is not possible. `field` is the source field mapped. Subclasses
+        overriding :meth:`map_value` should override this as well.
+        """
+
+        return (sql, params)
+
+    def as_sql(self, from_field, column, get_field):
+        if type(self).map.im_func is not IdentityMapping.map.im_func:
+            return None
+
+        # Every map_value() along the way needs its counterpart in SQL
+        if not self._implements('value_as_sql'):
+            return None
+
+        # Changes can't be reported for every object from SQL
+        if self.reportDataChanges and \
+                type(self).map_value.im_func is not IdentityMapping.map_value.im_func:
+            return None
+
+        value = self.value_as_sql(column(from_field), [], get_field(from_field))
+
+        if value is None:
+            return None
+
+        return [(self.get_to_field(from_field), ) + value]
+
+    def has_side_effects(self):
+        if type(self).map.im_func is not IdentityMapping.map.im_func:
+            return True
+
+        # Every map_value() along the way should be expressible in SQL or be
+        # declared pure
+        for cls in type(self).__mro__:
+            if 'map_value' in cls.__dict__ and 'value_as_sql' not in cls.__dict__ \
+                    and not cls.__dict__.get('pure', False):
+                return True
+
+        return False
+
     def check_value(self, old_value, new_value):
         return self.map_value(old_value) == new_value
 
@@ -110,6 +364,13 @@ class AutoUpdatedDateTimeMapping(Mapping):
 
         return from_field
 
+    def compile(self, from_field):
+        # Dealt with after the model is saved.
+        return []
+
+    def has_side_effects(self):
+        return False
+
     def check(self, from_instance, to_instance, from_field):
         # No check for this mapping.
         return True
@@ -131,6 +392,20 @@ class StringMapping(IdentityMapping):
 
         return old_value
 
+    def map_values(self, old_values):
+        return [
+            '' if old_value is None else old_value
+            for old_value in super(StringMapping, self).map_values(old_values)
+        ]
+
+    def value_as_sql(self, sql, params, field):
+        value = super(StringMapping, self).value_as_sql(sql, params, field)
+
+        if value is None:
+            return None
+
+        return ("COALESCE(%s, '')" % value[0], value[1])
+
 
 class CropMapping(StringMapping):
     """
@@ -149,6 +424,22 @@ class CropMapping(StringMapping):
         old_value = super(CropMapping, self).map_value(old_value)
         return old_value[:self.length]
 
+    def map_values(self, old_values):
+        length = self.length
+
+        return [
+            old_value[:length]
+            for old_value in super(CropMapping, self).map_values(old_values)
+        ]
+
+    def value_as_sql(self, sql, params, field):
+        value = super(CropMapping, self).value_as_sql(sql, params, field)
+
+        if value is None:
+            return None
+
+        return ('LEFT(%s, %d)' % (value[0], self.length), value[1])
+
 
 class DateTimeToDateMapping(IdentityMapping):
     """
@@ -168,6 +459,12 @@ class DateTimeToDateMapping(IdentityMapping):
 
         return old_value.date()
 
+    def map_values(self, old_values):
+        return [
+            None if old_value is None else old_value.date()
+            for old_value in super(DateTimeToDateMapping, self).map_values(old_values)
+        ]
+
 
 class EducateDateTimeMapping(IdentityMapping):
     """
@@ -227,12 +524,31 @@ class SubstitutionMapping(IdentityMapping):
     def map_value(self, old_value):
         return self.substitution % old_value
 
+    def value_as_sql(self, sql, params, field):
+        parts = self.substitution.split('%s')
+
+        # Only a single plain substitution can be done in SQL
+        if len(parts) != 2 or '%' in parts[0] + parts[1]:
+            return None
+
+        # Other types are formatted differently by the database
+        if not isinstance(field, (CharField, TextField, IntegerField)):
+            return None
+
+        # Like string formatting, None becomes 'None'
+        return (
+            "%%s || COALESCE(CAST(%s AS text), 'None') || %%s" % sql,
+            [parts[0]] + params + [parts[1]]
+        )
+
 
 class SlugifyMapping(IdentityMapping):
     """
     Mapping to create a slug out of the original value.
     """
 
+    pure = True
+
     def map_value(self, old_value):
         return slugify(old_value)
 
@@ -308,6 +624,50 @@ class OneToManyMapping(Mapping):
 
         return result_dict
 
+    def compile(self, from_field):
+        """ Flatten the steps of all mappings into a single list. """
+
+        if type(self).map.im_func is not OneToManyMapping.map.im_func:
+            return super(OneToManyMapping, self).compile(from_field)
+
+        steps = []
+        for mapping in self.mappings:
+            steps.extend(mapping.compile(from_field))
+
+        return steps
+
+    def as_sql(self, from_field, column, get_field):
+        if type(self).map.im_func is not OneToManyMapping.map.im_func:
+            return None
+
+        values = []
+        for mapping in self.mappings:
+            mapping_values = mapping.as_sql(from_field, column, get_field)
+
+            if mapping_values is None:
+                return None
+
+            values.extend(mapping_values)
+
+        return values
+
+    def has_side_effects(self):
+        if type(self).map.im_func is not OneToManyMapping.map.im_func:
+            return True
+
+        return any(mapping.has_side_effects() for mapping in self.mappings)
+
+    def iter_mappings(self):
+        yield self
+
+        for mapping in self.mappings:
+            for nested_mapping in mapping.iter_mappings():
+                yield nested_mapping
+
+    def reset(self):
+        for mapping in self.mappings:
+            mapping.reset()
+
     def check(self, from_instance, to_instance, from_field):
         success = True
 
@@ -332,10 +692,28 @@ class RelatedObjectMapping(Mapping):
         self.field_mapping = field_mapping
         self.reportDataChanges = reportDataChanges
 
+        # Resolved mappings, by field
+        self._mappings = {}
+
+    def iter_mappings(self):
+        yield self
+
+        for field in self.field_mapping.iterkeys():
+            for nested_mapping in self.get_mapping(field).iter_mappings():
+                yield nested_mapping
+
+    def reset(self):
+        for mapping in self._mappings.itervalues():
+            if mapping is not None:
+                mapping.reset()
+
     def get_mapping(self, field):
         """
         Get the mapping object for the specified field from `field_mapping`.
         """
+        if field in self._mappings:
+            return self._mappings[field]
+
         mapping = self.field_mapping.get(field)
 
         if mapping == True:
@@ -357,6 +735,9 @@ class RelatedObjectMapping(Mapping):
         # By this time mapping should be a callable yielding a dict
         assert callable(mapping), \
             u"No forward mapping defined for mapping %s" % mapping
+
+        self._mappings[field] = mapping
+
         return mapping
 
     def map(self, instance, from_field):
@@ -380,6 +761,29 @@ class RelatedObjectMapping(Mapping):
 
         return result_dict
 
+    def compile(self, from_field):
+        """
+        Compile the mappings of the related object once, only fetching the
+        related object per object migrated.
+        """
+
+        if type(self).map.im_func is not RelatedObjectMapping.map.im_func:
+            return super(RelatedObjectMapping, self).compile(from_field)
+
+        related_steps = []
+        for field in self.field_mapping.iterkeys():
+            related_steps.extend(self.get_mapping(field).compile(field))
+
+        def step(from_instance, to_instance):
+            from_related_instance = getattr(from_instance, from_field)
+
+            # If the related property is not set, skip going into it
+            if from_related_instance is not None:
+                for related_step in related_steps:
+                    related_step(from_related_instance, to_instance)
+
+        return [step]
+
     def check(self, from_instance, to_instance, from_field):
         from_related_instance = getattr(from_instance, from_field)
 
@@ -405,6 +809,8 @@ class MappingMapping(IdentityMapping):
     Maps a given dictionary of old values as keys to new values.
     """
 
+    pure = True
+
     def __init__(self, mapping, reportDataChanges=False, **kwargs):
         """
         Specify the `mapping` and, optionally, a `default`.
@@ -430,6 +836,40 @@ class MappingMapping(IdentityMapping):
 
         raise Exception(u"No mapping found for value '%s'." % old_value)
 
+    def map_values(self, old_values):
+        if not self.default_set:
+            return map(self.map_value, old_values)
+
+        get = self.mapping.get
+        default = self.default
+
+        return [get(old_value, default) for old_value in old_values]
+
+    def value_as_sql(self, sql, params, field):
+        # Values without a mapping should raise an exception
+        if not self.default_set:
+            return None
+
+        cases = []
+        case_params = []
+
+        for (old_value, new_value) in self.mapping.iteritems():
+            if old_value is None:
+                cases.append('WHEN %s IS NULL THEN %%s' % sql)
+                case_params.extend(params + [new_value])
+
+            else:
+                cases.append('WHEN %s = %%s THEN %%s' % sql)
+                case_params.extend(params + [old_value, new_value])
+
+        if not cases:
+            return ('%s', [self.default])
+
+        return (
+            'CASE %s ELSE %%s END' % ' '.join(cases),
+            case_params + [self.default]
+        )
+
 
 class WebsiteMapping(StringMapping):
     """
@@ -479,6 +919,9 @@ class StringToDecimalMapping(IdentityMapping):
 
         return Decimal(old_value)
 
+    def map_values(self, old_values):
+        return map(Decimal, super(StringToDecimalMapping, self).map_values(old_values))
+
 
 class ConcatenatingStringMapping(IdentityMapping):
     """ Map several fields to one by concatenation. """
@@ -517,6 +960,27 @@ class ConcatenatingStringMapping(IdentityMapping):
 
         return {self.get_to_field(from_field): concatenated_value}
 
+    def as_sql(self, from_field, column, get_field):
+        if type(self).map.im_func is not ConcatenatingStringMapping.map.im_func:
+            return None
+
+        parts = ["COALESCE(%s, '')" % column(from_field)]
+        params = []
+
+        for concat_field in self.concatenate_with:
+            concat_column = column(concat_field)
+
+            # Only concatenate for non-empty values
+            parts.append("CASE WHEN %s <> '' THEN %%s || %s ELSE '' END" % (
+                concat_column, concat_column
+            ))
+            params.append(self.concatenate_str)
+
+        return [(self.get_to_field(from_field), ' || '.join(parts), params)]
+
+    def has_side_effects(self):
+        return type(self).map.im_func is not ConcatenatingStringMapping.map.im_func
+
     def check(self, from_instance, to_instance, from_field):
         old_value = getattr(from_instance, from_field)
         concatenated_old_value = self._get_concatenated_value(from_instance, old_value)
@@ -1,3 +1,55 @@
 from django.db import models
 
-# This module exists just to allow Django to import this app.
\ No newline at end of file
+# This module exists to allow Django to import this app and holds the
+# bookkeeping used by the migrations themselves.
+
+
+class MigrationCheckpoint(models.Model):
+    """
+    Progress of a migration committing its objects in batches, which allows
+    an interrupted migration to be resumed after the last committed batch.
+    """
+
+    # Full import path of the migration class
+    migration = models.CharField(max_length=255, unique=True)
+
+    # Primary key of the last source object in the last committed batch
+    last_pk = models.CharField(max_length=255, blank=True)
+
+    migrated = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+
+    # Seconds spent migrating the committed batches
+    elapsed = models.FloatField(default=0)
+
+    started = models.DateTimeField()
+    updated = models.DateTimeField(auto_now=True)
+
+    # Whether the migration completed and passed its integrity tests
+    finished = models.BooleanField(default=False)
+
+    # Largest value of the change field of the source objects at the start of
+    # the last successful incremental run
+    watermark = models.CharField(max_length=255, blank=True)
+
+    def __unicode__(self):
+        return u'%s: %d objects migrated' % (self.migration, self.migrated)
+
+
+class RowDigest(models.Model):
+    """
+    Digest of the content of a migrated source object, used to detect changes
+    for incremental migrations of models without a change field.
+    """
+
+    # Full import path of the migration class
+    migration = models.CharField(max_length=255)
+
+    source_pk = models.CharField(max_length=255)
+    digest = models.CharField(max_length=40)
+
+    class Meta:
+        unique_together = ('migration', 'source_pk')
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.migration, self.source_pk)
@@ -0,0 +1,287 @@
+"""
+Helpers for running a single migration across a pool of worker processes,
+each migrating its own primary key range of the source queryset.
+"""
+
+import time
+import multiprocessing
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# State inherited by the worker processes when they are forked.
+_worker_state = {}
+
+# Database connections inherited from the parent process. These are never
+# used nor closed by workers, as closing them would end the sessions of the
+# parent, but references are kept so they are not garbage collected either.
+_inherited_connections = []
+
+
+def close_connections():
+    """ Close all database connections, so they are not shared by forks. """
+
+    for connection in connections.all():
+        connection.close()
+
+
+def detach_connections():
+    """
+    Make Django open new database connections in a forked process, without
+    closing the connections inherited from the parent process.
+    """
+
+    for connection in connections.all():
+        if connection.connection is not None:
+            _inherited_connections.append(connection.connection)
+            connection.connection = None
+
+
+def _start_repeatable_read(using):
+    """
+    Return a cursor for `using` within a fresh transaction with the
+    repeatable read isolation level.
+    """
+
+    connection = connections[using]
+
+    cursor = connection.cursor()
+
+    # Setting up the connection might have started a transaction already
+    connection.connection.commit()
+
+    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+    return cursor
+
+
+def export_snapshot(using):
+    """
+    Start a repeatable read transaction on database `using` and export its
+    snapshot, so other processes can read exactly the same data. Returns the
+    snapshot identifier, or None when the database does not support this.
+
+    The transaction has to be kept open for as long as the snapshot is used.
+    """
+
+    if connections[using].vendor != 'postgresql':
+        return None
+
+    cursor = _start_repeatable_read(using)
+    cursor.execute('SELECT pg_export_snapshot()')
+
+    return cursor.fetchone()[0]
+
+
+def import_snapshot(using, snapshot):
+    """ Start a transaction on `using` reading from an exported snapshot. """
+
+    cursor = _start_repeatable_read(using)
+    cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot])
+
+
+def get_pk_ranges(qs, parts, field='pk'):
+    """
+    Split `qs` into at most `parts` primary key ranges with about the same
+    number of objects. Returns a list of `(lower, upper)` tuples, where
+    `lower` is inclusive, `upper` is exclusive and None means unbounded.
+
+    Ranges of another `field` can be used, objects with the same value for
+    it always end up in the same range.
+    """
+
+    count = qs.count()
+    pks = qs.order_by(field).values_list(field, flat=True)
+
+    boundaries = []
+    for part in range(1, parts):
+        index = count * part // parts
+
+        if index < count:
+            pk = pks[index]
+
+            if pk is not None and pk not in boundaries:
+                boundaries.append(pk)
+
+    lowers = [None] + boundaries
+    uppers = boundaries + [None]
+
+    return zip(lowers, uppers)
+
+
+def filter_pk_range(qs, lower, upper, field='pk'):
+    """
+    Limit `qs` to a range returned by :func:`get_pk_ranges`. For fields
+    other than the primary key, the first range includes objects without a
+    value for `field`.
+    """
+
+    if lower is not None:
+        qs = qs.filter(**{'%s__gte' % field: lower})
+
+    if upper is not None:
+        condition = Q(**{'%s__lt' % field: upper})
+
+        if lower is None and field != 'pk':
+            condition |= Q(**{'%s__isnull' % field: True})
+
+        qs = qs.filter(condition)
+
+    return qs
+
+
+def _init_worker(using, snapshot):
+    """ Set up the database connections of a freshly forked worker. """
+
+    detach_connections()
+
+    if snapshot:
+        import_snapshot(using, snapshot)
+
+
+def _migrate_range(pk_range):
+    """ Migrate a single primary key range in a worker process. """
+
+    (lower, upper) = pk_range
+
+    migration = _worker_state['migration']
+    from_qs = filter_pk_range(_worker_state['from_qs'], lower, upper)
+
+    started = time.time()
+
+    with transaction.commit_on_success(using=migration.to_db):
+        counter = migration._migrate_batches(from_qs, _worker_state['debug_sql'])
+
+    return (lower, upper, counter, time.time() - started)
+
+
+def _verify_range(key_range):
+    """ Verify a single range of correspondence keys in a worker process. """
+
+    (lower, upper) = key_range
+
+    migration = _worker_state['migration']
+    (from_field, to_field) = _worker_state['fields']
+
+    verifier = migration._get_verifier(
+        filter_pk_range(_worker_state['from_qs'], lower, upper, from_field),
+        filter_pk_range(_worker_state['to_qs'], lower, upper, to_field)
+    )
+
+    (counter, errors) = verifier.verify()
+
+    return (lower, upper, counter, errors, verifier.failures)
+
+
+def _map_ranges(function, ranges, state, snapshot_using=None):
+    """
+    Call `function` for every range in `ranges` using a pool with a worker
+    process per range, which have `state` available as `_worker_state`. When
+    `snapshot_using` is given, all workers read from a single snapshot of
+    that database.
+
+    Returns the list of results.
+    """
+
+    _worker_state.update(state)
+
+    # Workers open connections of their own
+    close_connections()
+
+    snapshot = None
+
+    if snapshot_using:
+        snapshot = export_snapshot(snapshot_using)
+
+        if snapshot:
+            logger.info(u'Workers are reading from snapshot %s.', snapshot)
+
+    pool = multiprocessing.Pool(
+        processes=len(ranges),
+        initializer=_init_worker,
+        initargs=(snapshot_using, snapshot)
+    )
+
+    try:
+        return pool.map(function, ranges)
+
+    finally:
+        pool.close()
+        pool.join()
+
+        _worker_state.clear()
+
+        # Release the snapshot
+        close_connections()
+
+
+def migrate_parallel(migration, from_qs, workers, debug_sql=False):
+    """
+    Migrate the objects in `from_qs` using `workers` processes, each of which
+    migrates and commits a primary key range of its own. On PostgreSQL, all
+    workers read from a single snapshot of the source database.
+
+    Returns the total number of objects migrated.
+    """
+
+    ranges = get_pk_ranges(from_qs, workers)
+
+    results = _map_ranges(_migrate_range, ranges, {
+        'migration': migration,
+        'from_qs': from_qs,
+        'debug_sql': debug_sql,
+    }, snapshot_using=migration.from_db)
+
+    counter = 0
+    for (lower, upper, range_counter, elapsed) in results:
+        logger.info(
+            u'Range %s to %s: %d objects migrated in %.03f seconds.',
+            lower, upper, range_counter, elapsed
+        )
+
+        counter += range_counter
+
+    return counter
+
+
+def verify_parallel(migration, from_qs, to_qs, fields, workers):
+    """
+    Verify a migration using `workers` processes, each of which verifies a
+    range of correspondence keys of its own. The ranges are taken from the
+    pair of source and destination fields in `fields`, normally the first
+    of the correspondence fields of the migration.
+
+    Returns the total number of objects tested, the number of failures and
+    a list of `(from_pk, to_pk)` tuples for the failures.
+    """
+
+    (from_field, to_field) = fields
+
+    ranges = get_pk_ranges(from_qs, workers, from_field)
+
+    results = _map_ranges(_verify_range, ranges, {
+        'migration': migration,
+        'from_qs': from_qs,
+        'to_qs': to_qs,
+        'fields': fields,
+    })
+
+    counter = 0
+    errors = 0
+    failures = []
+
+    for (lower, upper, range_counter, range_errors, range_failures) in results:
+        logger.info(
+            u'Range %s to %s: %d objects tested, %d fails.',
+            lower, upper, range_counter, range_errors
+        )
+
+        counter += range_counter
+        errors += range_errors
+        failures.extend(range_failures)
+
+    return (counter, errors, failures)
@@ -0,0 +1,153 @@
+"""
+Profiler accumulating the time spent in the phases of a migration and in
+every field mapping.
+"""
+
+import time
+import json
+import threading
+
+from .utils import _get_thread_cpu
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Profiler(object):
+    """
+    Accumulates the number of calls, the wall clock time and the CPU time of
+    functions wrapped with :meth:`wrap`, by name. Names are grouped by kind,
+    like `'phase'` or `'mapping'`.
+
+    As only wrapped functions are timed, nothing is measured, nor slowed
+    down, unless a profiler is used.
+
+    Functions called from another wrapped function of the same kind, like
+    `post_save` from `post_save_batch`, are included in the time of the
+    latter. Only time spent outside of other functions of the same kind
+    counts towards their share of the total time.
+
+    CPU time is measured for the calling thread on Linux, so the work of
+    other threads, like verifying batches, is not included. Elsewhere it is
+    that of the whole process.
+    """
+
+    def __init__(self):
+        # [calls, wall time, CPU time, wall time when not nested] by
+        # (kind, name)
+        self.timings = {}
+
+        # Names of the functions calling others of the same kind, by
+        # (kind, name)
+        self.parents = {}
+
+        # Wrapped functions being called, per thread
+        self.local = threading.local()
+
+        self.started = time.time()
+
+    def wrap(self, kind, name, function):
+        """ Return a wrapper for `function` timing its calls under `name`. """
+
+        key = (kind, name)
+        timing = self.timings.setdefault(key, [0, 0.0, 0.0, 0.0])
+        parents = self.parents.setdefault(key, set())
+
+        def wrapper(*args, **kwargs):
+            active = self.local.__dict__.setdefault('active', [])
+
+            parent = None
+            for (active_kind, active_name) in reversed(active):
+                if active_kind == kind:
+                    parent = active_name
+                    break
+
+            active.append(key)
+
+            wall = time.time()
+            cpu = _get_thread_cpu()
+
+            try:
+                return function(*args, **kwargs)
+
+            finally:
+                active.pop()
+
+                elapsed = time.time() - wall
+
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] += _get_thread_cpu() - cpu
+
+                if parent is None:
+                    timing[3] += elapsed
+                elif parent != name:
+                    parents.add(parent)
+
+        wrapper.__name__ = getattr(function, '__name__', 'wrapper')
+        wrapper.__doc__ = getattr(function, '__doc__', None)
+
+        return wrapper
+
+    def get_ranking(self, kind):
+        """
+        Return `(name, calls, wall, cpu, own_wall)` tuples for all timings
+        of `kind`, taking the most wall clock time first, where `own_wall` is
+        the wall clock time not spent within other functions of `kind`.
+        """
+
+        ranking = [
+            (name, calls, wall, cpu, own_wall)
+            for ((timing_kind, name), (calls, wall, cpu, own_wall)) in self.timings.iteritems()
+            if timing_kind == kind and calls
+        ]
+
+        ranking.sort(key=lambda timing: timing[2], reverse=True)
+
+        return ranking
+
+    def report(self, title):
+        """ Log ranked tables of the timings, by kind. """
+
+        total = time.time() - self.started
+
+        lines = [u'%s profile, %.03f seconds in total:' % (title, total)]
+
+        for kind in sorted(set(kind for (kind, name) in self.timings)):
+            lines.append(u'')
+            lines.append(u'%-50s %10s %10s %7s %10s' % (
+                kind.capitalize(), u'calls', u'wall (s)', u'wall %', u'CPU (s)'
+            ))
+
+            for (name, calls, wall, cpu, own_wall) in self.get_ranking(kind):
+                parents = self.parents.get((kind, name))
+                if parents:
+                    name = u'%s (in %s)' % (name, u', '.join(sorted(parents)))
+
+                lines.append(u'%-50s %10d %10.03f %6.1f%% %10.03f' % (
+                    name[:50], calls, wall,
+                    100 * own_wall / total if total else 0, cpu
+                ))
+
+        lines.append(u'')
+        lines.append(u'Wall % excludes time spent within another entry of the same table.')
+
+        logger.info(u'\n'.join(lines))
+
+    def dump(self, path):
+        """ Write the timings to `path` as JSON. """
+
+        data = {'total': time.time() - self.started}
+
+        for kind in set(kind for (kind, name) in self.timings):
+            data[kind] = [
+                {
+                    'name': name, 'calls': calls, 'wall': wall, 'cpu': cpu,
+                    'own_wall': own_wall,
+                    'parents': sorted(self.parents.get((kind, name), ())),
+                }
+                for (name, calls, wall, cpu, own_wall) in self.get_ranking(kind)
+            ]
+
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,154 @@
+"""
+Progress reporting for migrations and integrity tests, with throughput and
+estimated time remaining, based on a single count of the objects involved.
+"""
+
+import time
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models.query import QuerySet
+
+from .settings import PROGRESS_INTERVAL
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def estimate_count(qs):
+    """
+    Return the number of objects in `qs` as estimated from the statistics
+    of the database, or None when no estimate is available. Estimates are
+    only available for unfiltered querysets on PostgreSQL.
+    """
+
+    if not isinstance(qs, QuerySet):
+        return None
+
+    query = qs.query
+    if query.where or query.having or query.distinct or \
+            query.low_mark or query.high_mark is not None:
+        return None
+
+    connection = connections[qs.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    cursor = connection.cursor()
+    cursor.execute(
+        'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+        [qs.model._meta.db_table]
+    )
+    row = cursor.fetchone()
+
+    # Tables which have never been analyzed have no estimate
+    if row is None or row[0] < 0:
+        return None
+
+    return int(row[0])
+
+
+def count_objects(qs, estimate=False):
+    """
+    Return the number of objects in `qs`, estimated from the statistics of
+    the database when `estimate` is set and possible, or None when it can't
+    be counted.
+    """
+
+    if estimate:
+        count = estimate_count(qs)
+
+        if count is not None:
+            return count
+
+    if isinstance(qs, QuerySet):
+        return qs.count()
+
+    try:
+        return len(qs)
+    except TypeError:
+        return None
+
+
+class Progress(object):
+    """
+    Reports the progress of processing `total` objects every `interval`
+    seconds, with the throughput, a moving average of the time spent per
+    object and the estimated time remaining.
+    """
+
+    # Weight of the latest update in the moving average
+    smoothing = 0.2
+
+    def __init__(self, description, total=None, done=0, interval=PROGRESS_INTERVAL):
+        self.description = description
+        self.total = total
+        self.interval = interval
+
+        self.done = done
+        self.initial = done
+
+        self.started = time.time()
+        self.updated = self.started
+        self.reported = self.started
+
+        # Moving average of the seconds spent per object
+        self.latency = None
+
+    def add(self, count):
+        """ Register `count` more objects as done, reporting when due. """
+
+        now = time.time()
+
+        if count:
+            latency = (now - self.updated) / count
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = self.smoothing * latency + \
+                    (1 - self.smoothing) * self.latency
+
+        self.done += count
+        self.updated = now
+
+        if now - self.reported >= self.interval:
+            self.report()
+
+    def get_rate(self):
+        """ Return the average number of objects per second so far. """
+
+        elapsed = time.time() - self.started
+
+        if not elapsed:
+            return 0.0
+
+        return (self.done - self.initial) / elapsed
+
+    def get_eta(self):
+        """ Return the estimated time remaining as a timedelta, or None. """
+
+        if self.total is None or self.latency is None:
+            return None
+
+        return timedelta(seconds=int(max(self.total - self.done, 0) * self.latency))
+
+    def report(self):
+        """ Log the current progress. """
+
+        self.reported = time.time()
+
+        if self.total:
+            logger.info(
+                u'%s: %d of %d objects (%.1f%%), %.1f objects/s, %.2f ms per object, %s remaining',
+                self.description, self.done, self.total,
+                100.0 * self.done / self.total, self.get_rate(),
+                1000 * (self.latency or 0), self.get_eta()
+            )
+
+        else:
+            logger.info(
+                u'%s: %d objects, %.1f objects/s, %.2f ms per object',
+                self.description, self.done, self.get_rate(),
+                1000 * (self.latency or 0)
+            )
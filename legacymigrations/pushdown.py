@@ -0,0 +1,195 @@
+"""
+Migration of a whole table with a single `INSERT ... SELECT`, for migrations
+of which all field mappings can be expressed in SQL and for which the source
+and destination tables live in the same database.
+"""
+
+from django.db import connections, transaction, DatabaseError
+from django.db.models import AutoField
+from django.utils.datastructures import SortedDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CannotPushDown(Exception):
+    """ Raised when a migration cannot be performed in SQL. """
+
+    pass
+
+
+def same_database(using, other):
+    """ Whether the database aliases `using` and `other` share a database. """
+
+    if connections[using].vendor != connections[other].vendor:
+        return False
+
+    settings_dict = connections[using].settings_dict
+    other_settings_dict = connections[other].settings_dict
+
+    return all(
+        settings_dict.get(key) == other_settings_dict.get(key)
+        for key in ('NAME', 'HOST', 'PORT')
+    )
+
+
+def get_insert_sql(migration, from_qs):
+    """
+    Return `(sql, params)` for a single `INSERT ... SELECT` migrating all
+    objects in `from_qs`. Raises :class:`CannotPushDown` when that is not
+    possible.
+    """
+
+    from_model = from_qs.model
+    to_model = migration.to_model
+
+    connection = connections[migration.to_db]
+    qn = connection.ops.quote_name
+
+    if connection.vendor != 'postgresql':
+        raise CannotPushDown(u'database %s is not PostgreSQL' % migration.to_db)
+
+    if not same_database(migration.from_db, migration.to_db):
+        raise CannotPushDown(
+            u'databases %s and %s differ' % (migration.from_db, migration.to_db)
+        )
+
+    if from_model._meta.parents or to_model._meta.parents:
+        raise CannotPushDown(u'models with multi-table inheritance are not supported')
+
+    # Source fields by field name and attribute name, related objects are
+    # not available
+    from_table = from_model._meta.db_table
+    from_fields = {}
+    for field in from_model._meta.local_fields:
+        from_fields[field.attname] = field
+
+        if not field.rel:
+            from_fields[field.name] = field
+
+    def get_field(name):
+        if name not in from_fields:
+            raise CannotPushDown(
+                u"'%s' is not a column of %s" % (name, from_model.__name__)
+            )
+
+        return from_fields[name]
+
+    def column(name):
+        return '%s.%s' % (qn(from_table), qn(get_field(name).column))
+
+    # Destination fields by field name and attribute name
+    to_fields = {}
+    for field in to_model._meta.local_fields:
+        to_fields[field.name] = field
+        to_fields[field.attname] = field
+
+    # SQL expressions by destination field, later mappings taking precedence
+    # like they do when setting attributes
+    values = SortedDict()
+
+    for (from_field, mapping) in migration._get_mappings():
+        mapped = mapping.as_sql(from_field, column, get_field)
+
+        if mapped is None:
+            raise CannotPushDown(
+                u"mapping %s of '%s' cannot be expressed in SQL" % (mapping, from_field)
+            )
+
+        for (to_field, sql, params) in mapped:
+            if to_field not in to_fields:
+                raise CannotPushDown(
+                    u"'%s' is not a field of %s" % (to_field, to_model.__name__)
+                )
+
+            values[to_fields[to_field]] = (sql, params)
+
+    # Fields which are not mapped get their defaults, like new objects do
+    instance = to_model()
+
+    for field in to_model._meta.local_fields:
+        if field in values or isinstance(field, AutoField):
+            continue
+
+        # A single value would be bound for all rows
+        if field.has_default() and callable(field.default):
+            raise CannotPushDown(
+                u"unmapped field '%s' has a callable default" % field.name
+            )
+
+        values[field] = ('%s', [field.get_db_prep_save(
+            field.pre_save(instance, True), connection=connection
+        )])
+
+    params = []
+    for (sql, value_params) in values.itervalues():
+        params.extend(value_params)
+
+    sql = 'INSERT INTO %s (%s) SELECT %s FROM %s' % (
+        qn(to_model._meta.db_table),
+        ', '.join(qn(field.column) for field in values.iterkeys()),
+        ', '.join(sql for (sql, value_params) in values.itervalues()),
+        qn(from_table)
+    )
+
+    query = from_qs.query
+    if query.where or query.extra or query.low_mark or query.high_mark is not None:
+        pk_qs = from_qs.values_list('pk', flat=True)
+
+        (pk_sql, pk_params) = pk_qs.query.get_compiler(migration.from_db).as_sql()
+
+        sql += ' WHERE %s.%s IN (%s)' % (
+            qn(from_table), qn(from_model._meta.pk.column), pk_sql
+        )
+        params.extend(pk_params)
+
+    return (sql, params)
+
+
+def migrate_pushdown(migration, from_qs):
+    """
+    Migrate all objects in `from_qs` with a single `INSERT ... SELECT` into
+    an empty destination table. Returns the number of objects migrated, or
+    None when the migration cannot be performed in SQL, in which case
+    nothing has been written.
+    """
+
+    if migration.to_model._default_manager.using(migration.to_db).exists():
+        logger.info(
+            u'Migrating %s in Python as the destination is not empty.', migration
+        )
+
+        return None
+
+    try:
+        (sql, params) = get_insert_sql(migration, from_qs)
+
+    except CannotPushDown as e:
+        logger.info(u'Migrating %s in Python as %s.', migration, e)
+
+        return None
+
+    logger.debug(u'Migrating %s with: %s', migration, sql)
+
+    sid = transaction.savepoint(using=migration.to_db)
+
+    try:
+        cursor = connections[migration.to_db].cursor()
+        cursor.execute(sql, params)
+
+    except DatabaseError as e:
+        transaction.savepoint_rollback(sid, using=migration.to_db)
+
+        logger.warning(
+            u'Migrating %s in SQL failed, migrating in Python instead: %s',
+            migration, e
+        )
+
+        return None
+
+    transaction.savepoint_commit(sid, using=migration.to_db)
+
+    # Have Django commit this, like any other write
+    transaction.commit_unless_managed(using=migration.to_db)
+
+    return cursor.rowcount
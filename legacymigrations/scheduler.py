@@ -0,0 +1,225 @@
+"""
+Scheduler running migrations concurrently in separate processes, in an order
+respecting the dependencies declared with `depends_on` on migration classes.
+"""
+
+import time
+import multiprocessing
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import get_models
+
+from .parallel import close_connections, detach_connections
+from .utils import get_migration_class
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def get_dependencies(migrations):
+    """
+    Return a dictionary with a list of dependencies for each import path in
+    `migrations`, taken from the `depends_on` attribute of the migration
+    classes, which lists class names or import paths.
+
+    Migrations without `depends_on` depend on all migrations preceding them,
+    just like when migrations are run one after another. Dependencies which
+    are not in `migrations` are assumed to have been run before.
+    """
+
+    by_name = {}
+    for path in migrations:
+        by_name[path] = path
+        by_name[path.rsplit('.', 1)[1]] = path
+
+    dependencies = {}
+
+    for (position, path) in enumerate(migrations):
+        depends_on = get_migration_class(path).depends_on
+
+        if depends_on is None:
+            dependencies[path] = list(migrations[:position])
+            continue
+
+        dependencies[path] = []
+        for name in depends_on:
+            if name in by_name:
+                dependencies[path].append(by_name[name])
+            else:
+                logger.debug(
+                    u"Dependency '%s' of '%s' is not being run.", name, path
+                )
+
+    # Make sure the dependencies can actually be satisfied
+    visited = set()
+    for path in migrations:
+        _check_cycles(path, dependencies, visited, [])
+
+    return dependencies
+
+
+def _check_cycles(path, dependencies, visited, chain):
+    """ Raise ImproperlyConfigured when `path` depends on itself. """
+
+    if path in chain:
+        raise ImproperlyConfigured(
+            'Circular migration dependencies: %s' %
+                ' -> '.join(chain[chain.index(path):] + [path])
+        )
+
+    if path in visited:
+        return
+
+    for dependency in dependencies[path]:
+        _check_cycles(dependency, dependencies, visited, chain + [path])
+
+    visited.add(path)
+
+
+def get_critical_path(migrations, dependencies, durations=None):
+    """
+    Return the chain of dependent migrations taking the longest time, as a
+    list of import paths along with its total duration. Without `durations`,
+    every migration counts as taking one unit of time.
+    """
+
+    longest = {}
+
+    def path_to(path):
+        if path not in longest:
+            duration = durations[path] if durations else 1
+
+            best = ([], 0)
+            for dependency in dependencies[path]:
+                candidate = path_to(dependency)
+
+                if candidate[1] > best[1]:
+                    best = candidate
+
+            longest[path] = (best[0] + [path], best[1] + duration)
+
+        return longest[path]
+
+    critical = ([], 0)
+    for path in migrations:
+        candidate = path_to(path)
+
+        if candidate[1] > critical[1]:
+            critical = candidate
+
+    return critical
+
+
+def preload(migrations):
+    """
+    Load all models and import the classes of `migrations` once, so forked
+    processes start with Django fully set up rather than importing and
+    setting up everything again for every migration.
+    """
+
+    get_models()
+
+    for path in migrations:
+        get_migration_class(path)
+
+
+def _run_child(run_migration, path):
+    """ Run a single migration in a freshly forked process. """
+
+    detach_connections()
+
+    run_migration(path)
+
+
+def run_scheduled(migrations, run_migration, jobs, poll_interval=0.2):
+    """
+    Run `migrations`, a list of import paths, with at most `jobs` concurrent
+    processes, each running a single migration by calling `run_migration`
+    with its import path. A migration is started as soon as all its
+    dependencies have completed successfully.
+
+    Processes are forked from this process after preloading Django and the
+    migrations, so every migration starts with fresh memory but without the
+    cost of starting up. With a single job, migrations run one after another.
+
+    Returns the wall clock duration of every migration by import path and
+    raises an exception when any of the migrations fails.
+    """
+
+    preload(migrations)
+
+    dependencies = get_dependencies(migrations)
+
+    (critical, length) = get_critical_path(migrations, dependencies)
+    logger.info(
+        u'Running %d migrations with %d jobs, longest chain (%d): %s',
+        len(migrations), jobs, length,
+        u' -> '.join(path.rsplit('.', 1)[1] for path in critical)
+    )
+
+    pending = list(migrations)
+    running = {}
+    started = {}
+    durations = {}
+    failed = []
+
+    while pending or running:
+        # Start whatever is ready, unless something failed
+        for path in list(pending):
+            if failed or len(running) >= jobs:
+                break
+
+            if all(dependency in durations for dependency in dependencies[path]):
+                pending.remove(path)
+
+                # Forks should not share connections with this process
+                close_connections()
+
+                process = multiprocessing.Process(
+                    target=_run_child, args=(run_migration, path)
+                )
+                process.start()
+
+                running[path] = process
+                started[path] = time.time()
+
+        if failed and not running:
+            break
+
+        time.sleep(poll_interval)
+
+        for (path, process) in running.items():
+            if process.is_alive():
+                continue
+
+            process.join()
+            del running[path]
+
+            if process.exitcode == 0:
+                durations[path] = time.time() - started[path]
+
+                logger.info(
+                    u'%s completed in %.03f seconds.', path, durations[path]
+                )
+
+            else:
+                logger.error(
+                    u'%s failed with exit code %d.', path, process.exitcode
+                )
+
+                failed.append(path)
+
+    if failed:
+        raise Exception('Migrations failed: %s' % ', '.join(failed))
+
+    (critical, length) = get_critical_path(migrations, dependencies, durations)
+    logger.info(
+        u'Critical path took %.03f seconds: %s',
+        length,
+        u' -> '.join(
+            u'%s (%.03f s)' % (path.rsplit('.', 1)[1], durations[path])
+            for path in critical
+        )
+    )
+
+    return durations
@@ -12,3 +12,92 @@ ENABLE_EXCLUSIONS = getattr(
     'LEGACY_MIGRATIONS_ENABLE_EXCLUSIONS',
     False
 )
+
+# Number of objects written with a single bulk_create() during migrations,
+# defaults to None meaning objects are saved one by one
+BATCH_SIZE = getattr(settings, 'LEGACY_MIGRATIONS_BATCH_SIZE', None)
+
+# Maximum number of destination objects for which an in-memory correspondence
+# index is built, larger tables are looked up per batch. None disables it.
+CORRESPONDENCE_INDEX_LIMIT = getattr(
+    settings,
+    'LEGACY_MIGRATIONS_CORRESPONDENCE_INDEX_LIMIT',
+    1000000
+)
+
+# Number of source objects fetched per query while iterating over the source
+# queryset
+CHUNK_SIZE = getattr(settings, 'LEGACY_MIGRATIONS_CHUNK_SIZE', 1000)
+
+# Whether to write auto updated datetime fields along with the object itself,
+# by suspending auto_now and auto_now_add while saving, rather than with a
+# separate UPDATE afterwards
+SUSPEND_AUTO_NOW = getattr(settings, 'LEGACY_MIGRATIONS_SUSPEND_AUTO_NOW', False)
+
+# Whether to commit migrations per batch, recording a checkpoint from which
+# interrupted migrations can be resumed, rather than in a single transaction
+COMMIT_BATCHES = getattr(settings, 'LEGACY_MIGRATIONS_COMMIT_BATCHES', False)
+
+# Whether to only migrate source objects which changed since the last
+# successful run, defaults to False
+INCREMENTAL = getattr(settings, 'LEGACY_MIGRATIONS_INCREMENTAL', False)
+
+# How batches of new objects are written: 'bulk' for bulk_create(), 'copy' for
+# PostgreSQL's COPY or 'auto' for COPY when possible, defaults to 'auto'
+WRITER = getattr(settings, 'LEGACY_MIGRATIONS_WRITER', 'auto')
+
+# Whether to read source objects as lightweight rows rather than model
+# instances, defaults to False
+LIGHTWEIGHT_ROWS = getattr(settings, 'LEGACY_MIGRATIONS_LIGHTWEIGHT_ROWS', False)
+
+# How migrated objects are validated: 'full' for full_clean() on every object,
+# 'fast' for validating objects in batches or None to skip validation,
+# defaults to 'full'
+VALIDATION = getattr(settings, 'LEGACY_MIGRATIONS_VALIDATION', 'full')
+
+# Validate only one in this number of migrated objects, defaults to 1
+VALIDATION_SAMPLE = getattr(settings, 'LEGACY_MIGRATIONS_VALIDATION_SAMPLE', 1)
+
+# How migrations are verified after migrating: 'merge' for testing every
+# object, or 'digest' for comparing digests of ranges of objects and only
+# testing objects in ranges which differ, defaults to 'merge'
+VERIFY = getattr(settings, 'LEGACY_MIGRATIONS_VERIFY', 'merge')
+
+# Seed for selecting objects when verifying a sample, defaults to 0
+VERIFY_SEED = getattr(settings, 'LEGACY_MIGRATIONS_VERIFY_SEED', 0)
+
+# Whether to verify every committed batch in a background thread while
+# migrating, defaults to False
+VERIFY_BATCHES = getattr(settings, 'LEGACY_MIGRATIONS_VERIFY_BATCHES', False)
+
+# Number of objects failing verification of batches after which the migration
+# is aborted, defaults to None for never aborting
+MAX_ERRORS = getattr(settings, 'LEGACY_MIGRATIONS_MAX_ERRORS', None)
+
+# Minimal number of seconds between progress reports, defaults to 10
+PROGRESS_INTERVAL = getattr(settings, 'LEGACY_MIGRATIONS_PROGRESS_INTERVAL', 10)
+
+# Whether to estimate the number of objects to migrate from the statistics of
+# the database where possible, rather than counting them, defaults to False
+ESTIMATE_COUNTS = getattr(settings, 'LEGACY_MIGRATIONS_ESTIMATE_COUNTS', False)
+
+# Whether to profile migrations, reporting the time spent per phase and per
+# field mapping, defaults to False
+PROFILE = getattr(settings, 'LEGACY_MIGRATIONS_PROFILE', False)
+
+# Path to write profiles to as JSON, where '%s' is replaced by the name of the
+# migration, defaults to None
+PROFILE_JSON = getattr(settings, 'LEGACY_MIGRATIONS_PROFILE_JSON', None)
+
+# Maximum resident memory of a migration process in megabytes, when exceeded
+# after a batch the batch size is halved, defaults to None for no limit
+MEMORY_BUDGET = getattr(settings, 'LEGACY_MIGRATIONS_MEMORY_BUDGET', None)
+
+# Whether to migrate with a single INSERT ... SELECT when the source and
+# destination share a PostgreSQL database and all mappings can be expressed in
+# SQL, defaults to False
+SQL_PUSHDOWN = getattr(settings, 'LEGACY_MIGRATIONS_SQL_PUSHDOWN', False)
+
+# Number of results of pure mappings cached per mapping while migrating,
+# defaults to 0, disabling caching
+MEMO_SIZE = getattr(settings, 'LEGACY_MIGRATIONS_MEMO_SIZE', 0)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from django.db import models, connections, DEFAULT_DB_ALIAS
+from django.test import TestCase
+from django.utils import unittest
+
+from .writers import CopyWriter
+
+
+class CopyTestObject(models.Model):
+    """ Object written both with bulk_create() and the COPY writer. """
+
+    # Whether the object has been written by the COPY writer
+    copied = models.BooleanField(default=False)
+
+    text = models.TextField(null=True)
+    char = models.CharField(max_length=50, null=True)
+    number = models.IntegerField(null=True)
+    flag = models.NullBooleanField()
+
+
+# Values which have to be escaped in COPY's text format, or could be mistaken
+# for escapes.
+TEXT_VALUES = [
+    None,
+    u'',
+    u'tab\there',
+    u'back\\slash',
+    u'new\nline',
+    u'carriage\rreturn',
+    u'\\N',
+    u'\\t\\n',
+    u'n\xf8n-āscii ☃',
+]
+
+
+@unittest.skipUnless(
+    connections[DEFAULT_DB_ALIAS].vendor == 'postgresql',
+    'The COPY writer requires PostgreSQL.'
+)
+class CopyWriterTest(TestCase):
+    """ Objects written by COPY should be stored like bulk_create() does. """
+
+    def get_objects(self, copied, pk_offset=None):
+        objects = []
+
+        for (index, value) in enumerate(TEXT_VALUES):
+            obj = CopyTestObject(
+                copied=copied, text=value, char=value,
+                number=None if value is None else index,
+                flag=None if value is None else bool(index % 2)
+            )
+
+            if pk_offset is not None:
+                obj.pk = pk_offset + index
+
+            objects.append(obj)
+
+        return objects
+
+    def get_rows(self, copied):
+        return list(
+            CopyTestObject.objects.filter(copied=copied).order_by('pk')
+                .values_list('text', 'char', 'number', 'flag')
+        )
+
+    def assertRoundTrip(self):
+        rows = self.get_rows(False)
+
+        self.assertEqual([row[0] for row in rows], TEXT_VALUES)
+        self.assertEqual([row[1] for row in rows], TEXT_VALUES)
+        self.assertEqual(self.get_rows(True), rows)
+
+    def test_generated_pk(self):
+        CopyTestObject.objects.bulk_create(self.get_objects(False))
+        CopyWriter(CopyTestObject, DEFAULT_DB_ALIAS).write(self.get_objects(True))
+
+        self.assertRoundTrip()
+
+    def test_explicit_pk(self):
+        CopyTestObject.objects.bulk_create(self.get_objects(False, 1000))
+        CopyWriter(CopyTestObject, DEFAULT_DB_ALIAS).write(self.get_objects(True, 2000))
+
+        self.assertRoundTrip()
+        self.assertEqual(
+            list(CopyTestObject.objects.filter(copied=True).values_list('pk', flat=True).order_by('pk')),
+            range(2000, 2000 + len(TEXT_VALUES))
+        )
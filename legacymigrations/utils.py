@@ -1,33 +1,485 @@
+import os
+import sys
 import time
+import threading
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from operator import itemgetter
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends import util
+from django.db.models.query import QuerySet
 from django.utils.datastructures import SortedDict
 from django.utils.functional import memoize
 from django.utils.importlib import import_module
 
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Number of queries executed per database alias, when counting queries.
+_query_counts = {}
+
+# Number of queries cleared from `connection.queries` per database alias.
+_cleared_queries = {}
+
+
+class CountingCursorWrapper(util.CursorWrapper):
+    """ Cursor wrapper counting the queries executed per database alias. """
+
+    def execute(self, sql, params=()):
+        # Like the regular wrapper, mark managed transactions dirty
+        self.set_dirty()
+
+        _query_counts[self.db.alias] = _query_counts.get(self.db.alias, 0) + 1
+
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.set_dirty()
+
+        _query_counts[self.db.alias] = _query_counts.get(self.db.alias, 0) + 1
 
-class Timer:
+        return self.cursor.executemany(sql, param_list)
+
+
+@contextmanager
+def counting_queries():
+    """
+    Context manager counting the queries executed through regular cursors
+    within the block, so they can be reported without `DEBUG`. With `DEBUG`,
+    `connection.queries` is used. The cursor wrapper of Django is replaced
+    for the whole process while counting, and restored afterwards.
     """
-    Generic timer class.
 
-    Source:
-    http://preshing.com/20110924/timing-your-code-using-pythons-with-statement
+    if issubclass(util.CursorWrapper, CountingCursorWrapper):
+        yield
+        return
+
+    cursor_wrapper = util.CursorWrapper
+    util.CursorWrapper = CountingCursorWrapper
+
+    try:
+        yield
+
+    finally:
+        util.CursorWrapper = cursor_wrapper
+
+
+def _get_query_counts():
+    """
+    Return the number of queries executed so far per database alias, for
+    the databases for which queries are recorded or counted.
     """
+
+    counts = {}
+
+    for connection in connections.all():
+        if connection.use_debug_cursor or \
+                (connection.use_debug_cursor is None and settings.DEBUG):
+            counts[connection.alias] = len(connection.queries) + \
+                _cleared_queries.get(connection.alias, 0)
+
+        elif issubclass(util.CursorWrapper, CountingCursorWrapper):
+            counts[connection.alias] = _query_counts.get(connection.alias, 0)
+
+    return counts
+
+
+def clear_queries():
+    """
+    Clear the queries recorded in `connection.queries` with `DEBUG`, which
+    are otherwise kept for as long as the process runs. Cleared queries are
+    still included in the numbers of queries measured.
+    """
+
+    for connection in connections.all():
+        if connection.queries:
+            _cleared_queries[connection.alias] = \
+                _cleared_queries.get(connection.alias, 0) + len(connection.queries)
+
+            connection.queries = []
+
+
+def get_rss():
+    """
+    Return the current RSS in bytes of this process, or None when it can't
+    be determined.
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+    except (IOError, IndexError, ValueError, OSError):
+        # Only available on Linux
+        return None
+
+
+def _get_usage():
+    """ Return the CPU time used and the peak RSS in bytes of this process. """
+
+    if resource is None:
+        return (time.clock(), None)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    # Reported in kilobytes on Linux, but in bytes on OS X
+    peak_rss = usage.ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+
+    return (usage.ru_utime + usage.ru_stime, peak_rss)
+
+
+# Usage of the calling thread only, supported by Linux but not named by
+# Python 2.
+if resource is None:
+    RUSAGE_THREAD = None
+else:
+    RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD',
+        1 if sys.platform.startswith('linux') else None)
+
+
+def _get_thread_cpu():
+    """
+    Return the CPU time used by the calling thread, or by the whole process
+    where the usage of threads is not available.
+    """
+
+    if RUSAGE_THREAD is None:
+        return _get_usage()[0]
+
+    usage = resource.getrusage(RUSAGE_THREAD)
+
+    return usage.ru_utime + usage.ru_stime
+
+
+class Measurement(object):
+    """
+    Context manager measuring the wall clock time, CPU time and queries per
+    database alias of a block of code, along with the peak RSS of the
+    process afterwards. The number of objects processed can be recorded in
+    `rows`.
+
+    Whether a block spent most of its time computing or waiting, mostly on
+    the database, follows from the CPU time compared to the wall clock time.
+    """
+
+    def __init__(self):
+        self.rows = None
+
     def __enter__(self):
-        self.start = time.clock()
+        self.start = time.time()
+        (self.start_cpu, peak_rss) = _get_usage()
+        self.start_queries = _get_query_counts()
+
         return self
 
     def __exit__(self, *args):
-        self.end = time.clock()
-        self.interval = self.end - self.start
+        self.end = time.time()
+        (end_cpu, self.peak_rss) = _get_usage()
+
+        self.wall = self.end - self.start
+        self.cpu = end_cpu - self.start_cpu
+
+        self.queries = {}
+        for (alias, count) in _get_query_counts().iteritems():
+            self.queries[alias] = count - self.start_queries.get(alias, 0)
+
+        # Compatibility with Timer
+        self.interval = self.wall
+
+    def is_cpu_bound(self):
+        """ Whether most of the wall clock time was spent computing. """
+
+        return self.cpu >= 0.5 * self.wall
+
+    def __unicode__(self):
+        parts = [u'%.03f seconds, %.03f seconds CPU (%s-bound)' % (
+            self.wall, self.cpu,
+            u'CPU' if self.is_cpu_bound() else u'I/O'
+        )]
+
+        if self.queries:
+            parts.append(u'%d queries (%s)' % (
+                sum(self.queries.itervalues()),
+                u', '.join(
+                    u'%s: %d' % (alias, count)
+                    for (alias, count) in sorted(self.queries.iteritems())
+                )
+            ))
+
+        if self.rows is not None:
+            parts.append(u'%d objects' % self.rows)
+
+            if self.wall:
+                parts.append(u'%.1f objects/s' % (self.rows / self.wall))
+
+        if self.peak_rss is not None:
+            parts.append(u'peak RSS %.1f MB' % (self.peak_rss / 1048576.0))
+
+        return u', '.join(parts)
+
+
+# Timing used to be done with a plain timer, measuring CPU time only.
+Timer = Measurement
+
+
+def get_ordering(qs):
+    """
+    Return the ordering of the queryset `qs` set by `order_by()` or the Meta
+    of its model, or an empty list when it is unordered or only ordered by
+    ascending primary key.
+    """
+
+    query = qs.query
+
+    if query.extra_order_by:
+        ordering = list(query.extra_order_by)
+    elif query.order_by:
+        ordering = list(query.order_by)
+    elif query.default_ordering:
+        ordering = list(qs.model._meta.ordering)
+    else:
+        ordering = []
+
+    pk = qs.model._meta.pk
+
+    if all(name in ('pk', pk.name, pk.attname) for name in ordering):
+        return []
+
+    return ordering
+
+
+def iter_chunks(qs, chunk_size, factory=None):
+    """
+    Iterate over `qs` in lists of at most `chunk_size` objects.
+
+    Querysets without an ordering of their own are walked in primary key
+    order using keyset pagination (`pk > last_pk LIMIT chunk_size`), so only
+    a single chunk is ever held in memory and each query stays cheap
+    regardless of the position in the table. Code relying on objects coming
+    in primary key order, like resuming after the last pk, should order `qs`
+    by pk or leave it unordered.
+
+    Querysets ordered otherwise, see :func:`get_ordering`, keep their
+    ordering, with the primary key breaking ties, and are walked using
+    `OFFSET`, which gets slower towards the end of large tables. Other
+    iterables are simply split up in chunks.
+
+    When given, `factory` is called for every result to create the objects
+    returned, which should have a `pk` attribute.
+    """
+
+    if factory is None:
+        factory = lambda obj: obj
+
+    if not isinstance(qs, QuerySet) or qs.query.low_mark or qs.query.high_mark:
+        chunk = []
+
+        for obj in qs:
+            chunk.append(factory(obj))
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+        return
+
+    ordering = get_ordering(qs)
+
+    if '?' in ordering:
+        logger.warning(
+            u'Random ordering of %s cannot be walked in chunks, ordering by pk.',
+            qs.model.__name__
+        )
+
+        ordering = []
+
+    if ordering:
+        qs = qs.order_by(*(ordering + ['pk']))
+        offset = 0
+
+        while True:
+            chunk = [factory(obj) for obj in qs[offset:offset + chunk_size]]
+
+            if chunk:
+                yield chunk
+
+            if len(chunk) < chunk_size:
+                break
+
+            offset += chunk_size
+
+        return
+
+    qs = qs.order_by('pk')
+    last_pk = None
+
+    while True:
+        if last_pk is None:
+            chunk_qs = qs[:chunk_size]
+        else:
+            chunk_qs = qs.filter(pk__gt=last_pk)[:chunk_size]
+
+        chunk = [factory(obj) for obj in chunk_qs]
+
+        if chunk:
+            yield chunk
+
+        if len(chunk) < chunk_size:
+            break
+
+        last_pk = chunk[-1].pk
+
+
+class LRUCache(object):
+    """
+    Wraps `function`, a function of a single value, caching the results for
+    the `maxsize` most recently used values. Hits and misses are counted.
+
+    Values are cached by their type as well, as equal values of different
+    types, like `1` and `True`, may be mapped differently. Unhashable values
+    are not cached.
+
+    The cache can be used from several threads, like those verifying batches
+    in the background. `function` itself is called without holding the lock.
+    """
+
+    def __init__(self, function, maxsize):
+        self.function = function
+        self.maxsize = maxsize
+
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def __call__(self, value):
+        key = (value.__class__, value)
+
+        try:
+            with self.lock:
+                result = self.cache.pop(key)
+
+                # Most recently used last
+                self.cache[key] = result
+                self.hits += 1
+
+            return result
+
+        except KeyError:
+            pass
+
+        except TypeError:
+            return self.function(value)
+
+        result = self.function(value)
+
+        with self.lock:
+            self.misses += 1
+
+            if key not in self.cache and len(self.cache) >= self.maxsize:
+                self.cache.popitem(last=False)
+
+            self.cache[key] = result
+
+        return result
+
+
+_row_classes = {}
+
+def get_row_class(model):
+    """
+    Return a compact, tuple based class for rows of the concrete fields of
+    `model`, as read with `values_list()`. Values are available as attributes
+    by the attribute names of the fields, like `getattr(instance, field)`
+    works for model instances, along with `pk`. Related objects are not
+    available.
+
+    Returns None when the fields of `model` cannot be represented this way.
+    """
+
+    if model not in _row_classes:
+        opts = model._meta
+        attnames = [field.attname for field in opts.fields]
+
+        try:
+            Row = namedtuple('%sRow' % model.__name__, attnames)
+        except ValueError:
+            _row_classes[model] = None
+            return None
+
+        def __getattr__(self, name):
+            raise AttributeError(
+                "'%s' is not available on rows of %s, set `lightweight_rows` "
+                "to False on the migration to use model instances." %
+                    (name, model.__name__)
+            )
+
+        def __unicode__(self):
+            return u'<%s row: %s>' % (model.__name__, self.pk)
+
+        _row_classes[model] = type(Row.__name__, (Row, ), {
+            '__slots__': (),
+            '_meta': opts,
+            'pk': property(itemgetter(attnames.index(opts.pk.attname))),
+            '__getattr__': __getattr__,
+            '__unicode__': __unicode__,
+            '__repr__': lambda self: unicode(self).encode('utf-8'),
+        })
+
+    return _row_classes[model]
+
+
+@contextmanager
+def suspended_auto_now(model, field_names):
+    """
+    Context manager temporarily disabling `auto_now` and `auto_now_add` on the
+    specified fields of `model`, so values set on instances are saved as is.
+    """
+
+    fields = [
+        field for field in
+            (model._meta.get_field(name) for name in field_names)
+        if hasattr(field, 'auto_now')
+    ]
+
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+
+    for field in fields:
+        field.auto_now = False
+        field.auto_now_add = False
+
+    try:
+        yield
+
+    finally:
+        for (field, auto_now, auto_now_add) in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
 
 
 _migrations = SortedDict()
 
-def _get_migration(import_path):
+def get_migration_class(import_path):
     """
-    Imports the staticfiles migration class described by import_path, where
-    import_path is the full Python path to the class.
+    Imports the migration class described by import_path, where import_path
+    is the full Python path to the class.
 
     This code has been borrowed from Django's staticfiles contrib.
     """
@@ -47,5 +499,13 @@ def _get_migration(import_path):
     if not issubclass(Migration, MigrateModel):
         raise ImproperlyConfigured('Migration "%s" is not a subclass of "%s"' %
                                    (Migration, MigrateModel))
-    return Migration()
+    return Migration
+
+
+def _get_migration(import_path):
+    """
+    Returns an instance of the migration class described by import_path.
+    """
+
+    return get_migration_class(import_path)()
 get_migration = memoize(_get_migration, _migrations, 1)
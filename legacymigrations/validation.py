@@ -0,0 +1,211 @@
+"""
+Validation of batches of migrated objects, performing the same checks as
+`full_clean()` with far fewer queries.
+"""
+
+from django.core import validators
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
+from django.db.models import Model, Field, ForeignKey
+
+
+class FastValidator(object):
+    """
+    Validates batches of objects of a single model, like `full_clean()` does
+    for every object individually.
+
+    The fields to check are determined once, for the model rather than for
+    every object. Instead of querying the database for every foreign key and
+    unique field of every object, foreign keys are checked with a single
+    query per field and batch and unique values are checked against the
+    other objects in the batch and with a single query per unique check.
+    """
+
+    def __init__(self, model, using):
+        self.model = model
+        self.using = using
+
+        # (field, check_existence) for every field to clean
+        self.fields = []
+        for field in model._meta.fields:
+            check_existence = isinstance(field, ForeignKey) and \
+                not field.rel.parent_link
+
+            self.fields.append((field, check_existence))
+
+        self.call_clean = model.clean.im_func is not Model.clean.im_func
+
+        (self.unique_checks, self.date_checks) = model()._get_unique_checks()
+
+    def clean_field(self, field, instance):
+        """
+        Clean the value of `field` on `instance` like `Field.clean()`,
+        without checking whether related objects exist.
+        """
+
+        value = field.to_python(getattr(instance, field.attname))
+
+        if type(field).validate.im_func is ForeignKey.validate.im_func:
+            # Skips the query done by ForeignKey.validate()
+            Field.validate(field, value, instance)
+        else:
+            field.validate(value, instance)
+
+        if field.validators:
+            field.run_validators(value)
+
+        setattr(instance, field.attname, value)
+
+        return value
+
+    def get_existing(self, field, values):
+        """ Return which of `values` refer to existing objects of `field`. """
+
+        rel = field.rel
+
+        qs = rel.to._default_manager.using(self.using).filter(
+            **{'%s__in' % rel.field_name: values}
+        ).complex_filter(rel.limit_choices_to)
+
+        return set(qs.values_list(rel.field_name, flat=True))
+
+    def get_unique_values(self, model_class, unique_check, keys):
+        """
+        Return a dictionary of the primary keys of objects in the database
+        by the values of the fields in `unique_check`, for objects matching
+        any of `keys`.
+        """
+
+        qs = model_class._default_manager.using(self.using).filter(
+            **{'%s__in' % unique_check[0]: set(key[0] for key in keys)}
+        ).values_list('pk', *unique_check)
+
+        existing = {}
+        for row in qs:
+            existing.setdefault(tuple(row[1:]), []).append(row[0])
+
+        return existing
+
+    def validate(self, instances):
+        """
+        Validate `instances` and return a list of `(instance, message_dict)`
+        tuples for the objects which did not validate.
+        """
+
+        # Errors by position, as unsaved objects all compare equal
+        errors = [{} for instance in instances]
+
+        # Positions of objects by field and value, for checking whether the
+        # referenced objects exist
+        related = {}
+
+        for (position, instance) in enumerate(instances):
+            instance_errors = errors[position]
+
+            for (field, check_existence) in self.fields:
+                raw_value = getattr(instance, field.attname)
+
+                if field.blank and raw_value in validators.EMPTY_VALUES:
+                    continue
+
+                try:
+                    value = self.clean_field(field, instance)
+                except ValidationError as e:
+                    instance_errors[field.name] = e.messages
+                    continue
+
+                if check_existence and value is not None:
+                    related.setdefault(field, {}).setdefault(value, []).append(position)
+
+            if self.call_clean:
+                try:
+                    instance.clean()
+                except ValidationError as e:
+                    e.update_error_dict(instance_errors)
+
+        for (field, values) in related.iteritems():
+            existing = self.get_existing(field, values.keys())
+
+            # Objects referring to others in the same batch
+            if issubclass(self.model, field.rel.to):
+                existing.update(
+                    getattr(instance, field.rel.get_related_field().attname)
+                    for instance in instances
+                )
+
+            for (value, referring) in values.iteritems():
+                if value in existing:
+                    continue
+
+                for position in referring:
+                    errors[position].setdefault(field.name, []).append(
+                        field.error_messages['invalid'] % {
+                            'model': field.rel.to._meta.verbose_name,
+                            'pk': value
+                        }
+                    )
+
+        for (model_class, unique_check) in self.unique_checks:
+            self.check_unique(model_class, unique_check, instances, errors)
+
+        if self.date_checks:
+            for (position, instance) in enumerate(instances):
+                date_errors = instance._perform_date_checks(self.date_checks)
+
+                for (key, messages) in date_errors.iteritems():
+                    errors[position].setdefault(key, []).extend(messages)
+
+        return [
+            (instance, instance_errors)
+            for (instance, instance_errors) in zip(instances, errors)
+            if instance_errors
+        ]
+
+    def check_unique(self, model_class, unique_check, instances, errors):
+        """
+        Check the fields in `unique_check` on `instances` against each other
+        and against the database, adding any errors to `errors`, a list of
+        error dictionaries for every object.
+        """
+
+        if len(unique_check) == 1:
+            key_name = unique_check[0]
+        else:
+            key_name = NON_FIELD_ERRORS
+
+        fields = [self.model._meta.get_field(name) for name in unique_check]
+
+        # Objects to check by their values for the unique fields
+        batch = {}
+        for (position, instance) in enumerate(instances):
+            # Like full_clean(), skip fields which did not validate
+            if any(name in errors[position] for name in unique_check):
+                continue
+
+            key = tuple(getattr(instance, field.attname) for field in fields)
+
+            if None in key:
+                continue
+
+            pk = instance._get_pk_val(model_class._meta)
+
+            batch.setdefault(key, []).append((position, pk))
+
+        if not batch:
+            return
+
+        existing = self.get_unique_values(model_class, unique_check, batch.keys())
+
+        for (key, candidates) in batch.iteritems():
+            for (index, (position, pk)) in enumerate(candidates):
+                instance = instances[position]
+
+                conflicts = [
+                    other_pk for other_pk in existing.get(key, [])
+                    if instance._state.adding or other_pk != pk
+                ]
+
+                # An earlier object in the batch claims the same values
+                if conflicts or index > 0:
+                    errors[position].setdefault(key_name, []).append(
+                        instance.unique_error_message(model_class, unique_check)
+                    )
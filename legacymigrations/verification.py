@@ -0,0 +1,793 @@
+"""
+Verification of migrated objects by joining the source and destination
+querysets on their correspondence keys, rather than looking up the
+corresponding object of every object separately.
+"""
+
+import sys
+import math
+import Queue
+import random
+import hashlib
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError, ImproperlyConfigured
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.encoding import force_unicode
+
+from .mappings import OneToManyMapping, AutoUpdatedDateTimeMapping
+from .parallel import filter_pk_range
+from .utils import iter_chunks, clear_queries
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class OrderMismatch(Exception):
+    """
+    Raised when the database orders correspondence keys differently from
+    Python, for instance because of the collation of a text column.
+    """
+
+    pass
+
+
+def iter_keys(qs, fields):
+    """
+    Yield `(key, pks)` tuples for all objects in `qs`, where `key` is a tuple
+    of the values of `fields` and `pks` the primary keys of the objects with
+    that key, in ascending order of `key`.
+    """
+
+    rows = qs.order_by(*fields).values_list('pk', *fields).iterator()
+
+    current = None
+    pks = []
+
+    for row in rows:
+        key = row[1:]
+
+        if pks and key == current:
+            pks.append(row[0])
+            continue
+
+        if pks:
+            if key < current:
+                raise OrderMismatch(
+                    'Key %r is ordered after %r by the database.' % (key, current)
+                )
+
+            yield (current, pks)
+
+        current = key
+        pks = [row[0]]
+
+    if pks:
+        yield (current, pks)
+
+
+def merge_keys(from_keys, to_keys):
+    """
+    Merge two streams returned by :func:`iter_keys`, yielding
+    `(key, from_pks, to_pks)` for every key occurring in either of them.
+    """
+
+    from_keys = iter(from_keys)
+    to_keys = iter(to_keys)
+
+    from_item = next(from_keys, None)
+    to_item = next(to_keys, None)
+
+    while from_item is not None or to_item is not None:
+        if to_item is None or \
+                (from_item is not None and from_item[0] < to_item[0]):
+            yield (from_item[0], from_item[1], [])
+            from_item = next(from_keys, None)
+
+        elif from_item is None or to_item[0] < from_item[0]:
+            yield (to_item[0], [], to_item[1])
+            to_item = next(to_keys, None)
+
+        else:
+            yield (from_item[0], from_item[1], to_item[1])
+            from_item = next(from_keys, None)
+            to_item = next(to_keys, None)
+
+
+class MergeVerifier(object):
+    """
+    Verifies a migration in a single pass over the correspondence keys of
+    the source and destination querysets, both read in key order.
+
+    Objects without a counterpart and keys shared by several objects are
+    reported from the keys alone. Objects which correspond one to one are
+    fetched in chunks and tested with `test_single()` of the migration.
+    """
+
+    # :class:`~progress.Progress` reporting the objects tested
+    progress = None
+
+    def __init__(self, migration, from_qs, to_qs, correspondence_fields):
+        self.migration = migration
+        self.from_qs = from_qs
+        self.to_qs = to_qs
+
+        self.from_fields = [from_field for (from_field, to_field) in correspondence_fields]
+        self.to_fields = [to_field for (from_field, to_field) in correspondence_fields]
+
+        self.counter = 0
+        self.errors = 0
+
+        # (from_pk, to_pk) of failures, None for objects without counterpart
+        self.failures = []
+
+    def test_pairs(self, pairs):
+        """ Test a chunk of `(from_pk, to_pk)` tuples of corresponding objects. """
+
+        from_instances = self.from_qs.in_bulk([from_pk for (from_pk, to_pk) in pairs])
+        to_instances = self.to_qs.in_bulk([to_pk for (from_pk, to_pk) in pairs])
+
+        results = self.migration.test_batch(
+            [from_instances[from_pk] for (from_pk, to_pk) in pairs],
+            [to_instances[to_pk] for (from_pk, to_pk) in pairs]
+        )
+
+        for ((from_pk, to_pk), success) in zip(pairs, results):
+            self.counter += 1
+
+            if not success:
+                self.errors += 1
+                self.failures.append((from_pk, to_pk))
+
+        self.migration._release_memory(resizable=False)
+
+        if self.progress:
+            self.progress.add(len(pairs))
+
+    def iter_pairs(self):
+        """
+        Yield `(from_pk, to_pk)` tuples for all objects corresponding one to
+        one, reporting all other objects.
+        """
+
+        for (key, from_pks, to_pks) in merge_keys(
+                iter_keys(self.from_qs, self.from_fields),
+                iter_keys(self.to_qs, self.to_fields)):
+
+            if not to_pks:
+                for from_pk in from_pks:
+                    logger.error(
+                        u'No correspondence for source object with pk %s.',
+                        from_pk
+                    )
+
+                self.errors += len(from_pks)
+                self.failures.extend((from_pk, None) for from_pk in from_pks)
+
+            elif not from_pks:
+                for to_pk in to_pks:
+                    logger.error(
+                        u'No backwards correspondence to object with pk %s, skipping tests for this object.',
+                        to_pk
+                    )
+
+                self.counter += len(to_pks)
+                self.errors += len(to_pks)
+                self.failures.extend((None, to_pk) for to_pk in to_pks)
+
+            elif len(from_pks) > 1 or len(to_pks) > 1:
+                logger.error(
+                    u'No bi-directional correspondence for %s, source objects %s, destination objects %s.',
+                    dict(zip(self.to_fields, key)), from_pks, to_pks
+                )
+
+                self.counter += len(to_pks)
+                self.errors += len(to_pks)
+                self.failures.extend(
+                    (from_pks[0] if len(from_pks) == 1 else None, to_pk)
+                    for to_pk in to_pks
+                )
+
+            else:
+                yield (from_pks[0], to_pks[0])
+
+    def select(self, pairs):
+        """ Return the pairs of corresponding objects to test, all of them. """
+
+        return pairs
+
+    def verify(self):
+        """
+        Verify all objects and return the number of destination objects
+        tested along with the number of failures.
+
+        Raises :class:`OrderMismatch` when keys can't be merged in the order
+        returned by the database.
+        """
+
+        pairs = []
+
+        for pair in self.select(self.iter_pairs()):
+            pairs.append(pair)
+
+            if len(pairs) >= self.migration.chunk_size:
+                self.test_pairs(pairs)
+                pairs = []
+
+        if pairs:
+            self.test_pairs(pairs)
+
+        return (self.counter, self.errors)
+
+
+def get_sample_size(verify):
+    """
+    Return the sample size for a `verify` setting like `'sample:0.01'`, as a
+    fraction when it has a decimal point or as a number of objects otherwise.
+    Returns None for other ways of verification.
+    """
+
+    if not verify or not verify.startswith('sample:'):
+        return None
+
+    value = verify[len('sample:'):]
+
+    try:
+        if '.' in value:
+            size = float(value)
+            valid = 0 < size <= 1
+        else:
+            size = int(value)
+            valid = size > 0
+
+    except ValueError:
+        valid = False
+
+    if not valid:
+        raise ImproperlyConfigured(
+            "Invalid sample '%s', use a fraction like 'sample:0.01' or a "
+            "number of objects like 'sample:1000'." % verify
+        )
+
+    return size
+
+
+def get_error_bound(failed, tested, z=1.96):
+    """
+    Return the upper bound of the Wilson score interval for the error rate
+    given `failed` out of `tested` objects, by default with 95% confidence.
+    """
+
+    if not tested:
+        return 1.0
+
+    rate = float(failed) / tested
+    z2 = z * z
+
+    return (
+        rate + z2 / (2 * tested) +
+        z * math.sqrt(rate * (1 - rate) / tested + z2 / (4 * tested * tested))
+    ) / (1 + z2 / tested)
+
+
+class Sampler(object):
+    """
+    Selects a reproducible random sample of items, either every item with
+    the probability `size`, when it is a fraction, or exactly `size` items
+    by reservoir sampling.
+    """
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.random = random.Random(seed)
+
+        # Number of items sampled from
+        self.seen = 0
+
+    def sample(self, items):
+        """ Yield the selected items of the iterable `items`. """
+
+        if isinstance(self.size, float):
+            for item in items:
+                self.seen += 1
+
+                if self.random.random() < self.size:
+                    yield item
+
+            return
+
+        reservoir = []
+
+        for item in items:
+            self.seen += 1
+
+            if len(reservoir) < self.size:
+                reservoir.append(item)
+            else:
+                index = self.random.randint(0, self.seen - 1)
+
+                if index < self.size:
+                    reservoir[index] = item
+
+        for item in reservoir:
+            yield item
+
+    def log_estimate(self, failed, tested):
+        """ Report the estimated error rate of the population sampled from. """
+
+        if not tested:
+            logger.warning(u'No objects have been sampled out of %d.', self.seen)
+            return
+
+        logger.info(
+            u'%d of %d objects sampled with %d fails, estimated error rate '
+            u'%.2f%%, at most %.2f%% with 95%% confidence.',
+            tested, self.seen, failed, 100.0 * failed / tested,
+            100.0 * get_error_bound(failed, tested)
+        )
+
+
+class SampleVerifier(MergeVerifier):
+    """
+    Like :class:`MergeVerifier`, but only tests a random sample of the
+    objects corresponding one to one, selected by a :class:`Sampler`.
+    Objects without correspondence are still all reported.
+    """
+
+    def __init__(self, migration, from_qs, to_qs, correspondence_fields, sampler):
+        super(SampleVerifier, self).__init__(
+            migration, from_qs, to_qs, correspondence_fields
+        )
+
+        self.sampler = sampler
+
+        self.tested = 0
+        self.failed = 0
+
+    def select(self, pairs):
+        return self.sampler.sample(pairs)
+
+    def test_pairs(self, pairs):
+        errors = self.errors
+
+        super(SampleVerifier, self).test_pairs(pairs)
+
+        self.tested += len(pairs)
+        self.failed += self.errors - errors
+
+    def verify(self):
+        result = super(SampleVerifier, self).verify()
+
+        self.sampler.log_estimate(self.failed, self.tested)
+
+        return result
+
+
+# Destination row as read for digest verification.
+_KeyedRow = namedtuple('_KeyedRow', ['pk', 'values'])
+
+
+class _RecordingInstance(object):
+    """
+    Wraps a model instance, recording the names of the attributes set on it
+    by mappings.
+    """
+
+    def __init__(self, instance):
+        object.__setattr__(self, '_instance', instance)
+        object.__setattr__(self, '_names', set())
+
+    def __getattr__(self, name):
+        return getattr(self._instance, name)
+
+    def __setattr__(self, name, value):
+        self._names.add(name)
+        setattr(self._instance, name, value)
+
+
+class DigestVerifier(object):
+    """
+    Verifies a migration by comparing digests of buckets of objects, rather
+    than testing every object. Only supports correspondence by primary key.
+
+    Source objects are mapped onto new destination objects with the field
+    mappings of the migration and their mapped values are digested, along
+    with the same columns of the destination objects. Both sides are read in
+    primary key order and split into the same primary key ranges. Only the
+    objects in ranges whose digests differ are tested, using a
+    :class:`MergeVerifier`.
+
+    As objects in matching ranges are not tested with `test_single()`,
+    checks added to it by migrations only apply to mismatching ranges.
+
+    Mapping objects again should not have side effects, so migrations with
+    mappings which might have any are refused, see
+    :meth:`~mappings.Mapping.has_side_effects`.
+    """
+
+    def __init__(self, migration, from_qs, to_qs):
+        self.check_migration(migration)
+
+        self.migration = migration
+        self.from_qs = from_qs
+        self.to_qs = to_qs
+        self.connection = connections[migration.to_db]
+
+        # Destination fields compared
+        self.fields = None
+
+        self.counter = 0
+        self.errors = 0
+        self.failures = []
+
+    def check_migration(self, migration):
+        """
+        Raise ImproperlyConfigured when mapping the objects of `migration`
+        might have side effects.
+        """
+
+        if migration._overrides('map_fields'):
+            raise ImproperlyConfigured(
+                u'Digest verification is not possible for %s as it overrides '
+                u'map_fields(), use merge verification instead.' % migration
+            )
+
+        mappings = [
+            u"'%s' %r" % (field, mapping)
+            for (field, mapping) in migration._get_mappings()
+            if mapping.has_side_effects()
+        ]
+
+        if mappings:
+            raise ImproperlyConfigured(
+                u'Digest verification is not possible for %s as the mappings '
+                u'of %s might have side effects, use merge verification '
+                u'instead.' % (migration, u', '.join(mappings))
+            )
+
+    def map_instance(self, from_instance):
+        """
+        Map `from_instance` onto a new destination object, returning the
+        object along with the names of the attributes set.
+        """
+
+        recorder = _RecordingInstance(self.migration.to_model())
+        self.migration.map_fields(from_instance, recorder)
+
+        return (recorder._instance, recorder._names)
+
+    def get_mapped_names(self, from_field, mapping):
+        """
+        Return the names of the destination fields set by `mapping` for
+        `from_field`, as far as they can be told without mapping objects.
+        """
+
+        if isinstance(mapping, AutoUpdatedDateTimeMapping):
+            # Set after saving, rather than by mapping
+            return set()
+
+        if isinstance(mapping, OneToManyMapping):
+            names = set()
+            for nested_mapping in mapping.mappings:
+                names.update(self.get_mapped_names(from_field, nested_mapping))
+
+            return names
+
+        if hasattr(mapping, 'get_to_field'):
+            return set([mapping.get_to_field(from_field)])
+
+        return set()
+
+    def get_fields(self, names):
+        """ Return the destination fields for the attribute `names` set. """
+
+        meta = self.migration.to_model._meta
+
+        return [
+            field for field in meta.fields
+            if (field.name in names or field.attname in names) and
+                field is not meta.pk
+        ]
+
+    def normalize(self, field, value):
+        """
+        Return `value` of `field` as it would be stored, as unicode. Mapped
+        values and values read from the destination are normalized alike,
+        datetimes are made timezone aware and converted to UTC.
+        """
+
+        if value is None:
+            return u'\\N'
+
+        try:
+            value = field.to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            pass
+
+        if isinstance(value, datetime) and settings.USE_TZ:
+            value = self.migration.make_datetime_timezone_aware(value)
+            value = value.astimezone(timezone.utc)
+
+        try:
+            value = field.get_db_prep_save(value, connection=self.connection)
+        except (ValidationError, TypeError, ValueError):
+            pass
+
+        return force_unicode(value, errors='replace')
+
+    def row_digest(self, pk, values):
+        """ Return the digest of a row, given the values of `fields`. """
+
+        normalized = [
+            self.normalize(field, value)
+            for (field, value) in zip(self.fields, values)
+        ]
+
+        return hashlib.sha1(
+            u'\x1f'.join([unicode(pk)] + normalized).encode('utf-8')
+        ).digest()
+
+    def source_buckets(self):
+        """
+        Digest the mapped source objects, returning the lower bounds of the
+        primary key ranges along with a list of `[digest, count]` for each.
+        The first range has no lower bound.
+
+        The fields compared are those known to be set by the mappings. When
+        mapping sets other fields as well, which custom mappings may do for
+        some objects only, the objects are digested again including those.
+        """
+
+        names = set()
+        for (from_field, mapping) in self.migration._get_mappings():
+            names.update(self.get_mapped_names(from_field, mapping))
+
+        self.fields = self.get_fields(names)
+
+        while True:
+            (lowers, buckets, names) = self._digest_source()
+
+            fields = self.get_fields(names)
+
+            if set(fields) <= set(self.fields):
+                return (lowers, buckets)
+
+            self.fields.extend(field for field in fields if field not in self.fields)
+
+            logger.info(
+                u'Mappings set fields which were not digested, digesting source objects again.'
+            )
+
+    def _digest_source(self):
+        """
+        Digest the mapped source objects for the current `fields`, see
+        :meth:`source_buckets`. Returns the names of all attributes set by
+        mapping as well.
+        """
+
+        chunk_size = self.migration.chunk_size
+
+        lowers = []
+        buckets = []
+        names = set()
+
+        for chunk in self.migration._iter_from_batches(self.from_qs.order_by('pk')):
+            mapped = [
+                (from_instance.pk, ) + self.map_instance(from_instance)
+                for from_instance in chunk
+            ]
+
+            for (pk, to_instance, instance_names) in mapped:
+                names.update(instance_names)
+
+                if not buckets or buckets[-1][1] >= chunk_size:
+                    lowers.append(pk if buckets else None)
+                    buckets.append([hashlib.sha1(), 0])
+
+                buckets[-1][0].update(self.row_digest(
+                    pk, [getattr(to_instance, field.attname) for field in self.fields]
+                ))
+                buckets[-1][1] += 1
+
+        if not buckets:
+            lowers.append(None)
+            buckets.append([hashlib.sha1(), 0])
+
+        return (
+            lowers, [(digest.digest(), count) for (digest, count) in buckets], names
+        )
+
+    def destination_buckets(self, lowers):
+        """ Digest the destination objects for the ranges in `lowers`. """
+
+        buckets = [[hashlib.sha1(), 0] for lower in lowers]
+
+        qs = self.to_qs.order_by('pk').values_list(
+            'pk', *[field.name for field in self.fields]
+        )
+        factory = lambda row: _KeyedRow(row[0], row[1:])
+
+        for chunk in iter_chunks(qs, self.migration.chunk_size, factory):
+            for row in chunk:
+                bucket = buckets[max(bisect_right(lowers, row.pk) - 1, 0)]
+
+                bucket[0].update(self.row_digest(row.pk, row.values))
+                bucket[1] += 1
+
+        return [(digest.digest(), count) for (digest, count) in buckets]
+
+    def verify(self):
+        """
+        Verify all objects and return the number of destination objects
+        verified along with the number of failures.
+        """
+
+        (lowers, from_buckets) = self.source_buckets()
+
+        to_buckets = self.destination_buckets(lowers)
+
+        uppers = lowers[1:] + [None]
+
+        mismatches = 0
+
+        for (lower, upper, from_bucket, to_bucket) in zip(
+                lowers, uppers, from_buckets, to_buckets):
+
+            if from_bucket == to_bucket:
+                self.counter += to_bucket[1]
+                continue
+
+            mismatches += 1
+
+            logger.info(
+                u'Digests differ for pk range %s to %s, testing objects.',
+                lower, upper
+            )
+
+            verifier = MergeVerifier(
+                self.migration,
+                filter_pk_range(self.from_qs, lower, upper),
+                filter_pk_range(self.to_qs, lower, upper),
+                (('pk', 'pk'), )
+            )
+
+            (counter, errors) = verifier.verify()
+
+            self.counter += counter
+            self.errors += errors
+            self.failures.extend(verifier.failures)
+
+        logger.info(
+            u'Digests compared for %d pk ranges, %d differ.',
+            len(from_buckets), mismatches
+        )
+
+        return (self.counter, self.errors)
+
+
+class BatchVerifier(object):
+    """
+    Verifies batches of migrated objects in a background thread, using its
+    own database connections, while the next batches are being migrated.
+    Batches have to be committed before they are submitted.
+
+    Once more than `max_errors` objects failed verification, submitting a
+    batch raises an exception, aborting the migration.
+    """
+
+    def __init__(self, migration, max_errors=None):
+        self.migration = migration
+        self.max_errors = max_errors
+
+        # Limits the number of batches waiting for verification
+        self.queue = Queue.Queue(maxsize=2)
+
+        self.counter = 0
+        self.errors = 0
+
+        # Information about an exception raised while verifying
+        self.exc_info = None
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        """ Verify submitted batches until None is submitted. """
+
+        while True:
+            from_instances = self.queue.get()
+
+            if from_instances is None:
+                break
+
+            # Keep consuming batches, which are no longer verified
+            if self.exc_info or self.exceeded():
+                continue
+
+            try:
+                self.verify_batch(from_instances)
+            except Exception:
+                self.exc_info = sys.exc_info()
+
+        # Connections are opened for every thread
+        for connection in connections.all():
+            connection.close()
+
+    def verify_batch(self, from_instances):
+        """ Test a batch of source objects against the committed objects. """
+
+        to_instances = self.migration._find_to(from_instances)
+
+        for (from_instance, to_instance) in zip(from_instances, to_instances):
+            self.counter += 1
+
+            if to_instance is None:
+                logger.error(
+                    u'No correspondence for %s after migrating it.',
+                    unicode(from_instance)
+                )
+
+                self.errors += 1
+
+            elif not self.migration.test_single(from_instance, to_instance):
+                self.errors += 1
+
+        # End the read transactions, so the next batch is visible as well
+        for using in (self.migration.from_db, self.migration.to_db):
+            transaction.commit_unless_managed(using=using)
+
+        # Queries of this thread, recorded with DEBUG
+        clear_queries()
+
+    def exceeded(self):
+        """ Whether more than `max_errors` objects failed verification. """
+
+        return self.max_errors is not None and self.errors > self.max_errors
+
+    def check(self):
+        """ Raise an exception when verification failed. """
+
+        if self.exc_info:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+        if self.exceeded():
+            raise Exception(
+                '%d objects failed verification, exceeding the maximum of %d.' %
+                    (self.errors, self.max_errors)
+            )
+
+    def submit(self, from_instances):
+        """ Verify the objects migrated from a committed batch. """
+
+        self.check()
+
+        self.queue.put(list(from_instances))
+
+    def stop(self):
+        """ Wait for the thread to finish. """
+
+        self.queue.put(None)
+        self.thread.join()
+
+    def finish(self):
+        """
+        Wait for all submitted batches to be verified and report the result,
+        raising an exception when verification failed.
+        """
+
+        self.stop()
+
+        logger.info(
+            u'%d objects verified while migrating, %d fails.',
+            self.counter, self.errors
+        )
+
+        self.check()
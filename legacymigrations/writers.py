@@ -0,0 +1,110 @@
+"""
+Writers storing batches of new objects in the destination database.
+"""
+
+from cStringIO import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import AutoField
+
+
+class CopyWriter(object):
+    """
+    Writes new objects using PostgreSQL's `COPY FROM STDIN`, which is a lot
+    faster than `INSERT` statements for large numbers of objects.
+
+    Values are prepared for the database the same way `bulk_create()` does and
+    streamed in COPY's text format. Like with `bulk_create()`, `save()` is not
+    called and no signals are sent.
+    """
+
+    def __init__(self, model, using):
+        self.model = model
+        self.using = using
+        self.connection = connections[using]
+
+        if self.connection.vendor != 'postgresql':
+            raise ImproperlyConfigured(
+                'The COPY writer requires PostgreSQL, database %s is %s.' %
+                    (using, self.connection.vendor)
+            )
+
+        if model._meta.parents:
+            raise ImproperlyConfigured(
+                "Can't COPY objects of a multi-table inherited model."
+            )
+
+        self.fields = model._meta.local_fields
+
+    def serialize(self, value):
+        """ Return a value prepared for the database in COPY text format. """
+
+        if value is None:
+            return '\\N'
+
+        if value is True:
+            return 't'
+
+        if value is False:
+            return 'f'
+
+        if isinstance(value, float):
+            value = repr(value)
+
+        elif not isinstance(value, basestring):
+            value = unicode(value)
+
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+
+        return value.replace('\\', '\\\\').replace('\t', '\\t') \
+            .replace('\n', '\\n').replace('\r', '\\r')
+
+    def _copy(self, instances, fields):
+        """ Write `instances` with a single COPY of `fields`. """
+
+        qn = self.connection.ops.quote_name
+
+        data = StringIO()
+
+        for instance in instances:
+            data.write('\t'.join(
+                self.serialize(field.get_db_prep_save(
+                    field.pre_save(instance, True), connection=self.connection
+                ))
+                for field in fields
+            ))
+            data.write('\n')
+
+        data.seek(0)
+
+        cursor = self.connection.cursor()
+        cursor.copy_expert(
+            'COPY %s (%s) FROM STDIN' % (
+                qn(self.model._meta.db_table),
+                ', '.join(qn(field.column) for field in fields)
+            ),
+            data
+        )
+
+        # Have Django commit this, like any other write
+        transaction.commit_unless_managed(using=self.using)
+
+    def write(self, instances):
+        """
+        Write new `instances`. Objects without a primary key get one
+        generated by the database, which is not set on the instances.
+        """
+
+        with_pk = [instance for instance in instances if instance.pk is not None]
+        without_pk = [instance for instance in instances if instance.pk is None]
+
+        if with_pk:
+            self._copy(with_pk, self.fields)
+
+        if without_pk:
+            self._copy(without_pk, [
+                field for field in self.fields
+                if not isinstance(field, AutoField)
+            ])
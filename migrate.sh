@@ -43,10 +43,9 @@ python manage.py loaddata region_subregion_country_data
 python manage.py loaddata project_partnerorganization_data
 python manage.py loaddata project_theme_data
 
-# Do the migration. The migrations are being done individually so that the memory consumption is reset after each run.
-for migration in $(grep "legacy\.legacymigration\." bluebottle/settings/defaults.py | sed -e "s/'.*\.//" -e "s/',*//"); do
-  python manage.py migrate_legacy -v 2 $migration
-done
+# Do the migration. Every migration is run in a process of its own, forked after
+# loading Django once, so that the memory consumption is reset after each run.
+python manage.py migrate_legacy -v 2 --isolate $(grep "legacy\.legacymigration\." bluebottle/settings/defaults.py | sed -e "s/'.*\.//" -e "s/',*//")
 
 # Finish the script if this is being run on the server.
 if [ $# -gt 0 -a "x$1" = "x--server-migration" ]; then